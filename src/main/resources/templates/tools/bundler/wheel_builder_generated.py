@@ -3,15 +3,25 @@
 """Creates Python wheels for proto bundles"""
 
 import argparse
+import contextlib
+import importlib.util
+import io
 import os
 import re
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 
+# bundle.yaml's top-level `version:` line, and the characters a version may use
+VERSION_LINE_RE = re.compile(r"^version:\s*['\"]?([^'\"\s]+)")
+VERSION_RE = re.compile(r'[0-9A-Za-z.+~-]+')
+
+
 def read_bundle_version(bundle_yaml_path):
     """Read the top-level `version:` from a bundle.yaml.
 
@@ -23,7 +33,7 @@ def read_bundle_version(bundle_yaml_path):
     try:
         with open(bundle_yaml_path, encoding='utf-8') as f:
             for line in f:
-                match = re.match(r"^version:\s*['\"]?([^'\"\s]+)", line)
+                match = line.startswith('version:') and VERSION_LINE_RE.match(line)
                 if match:
                     version = match.group(1)
                     break
@@ -35,13 +45,87 @@ def read_bundle_version(bundle_yaml_path):
         print(f"Error: no top-level 'version:' line found in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
-    if not re.fullmatch(r'[0-9A-Za-z.+~-]+', version):
+    if not VERSION_RE.fullmatch(version):
         print(f"Error: malformed version {version!r} in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
     return version
 
 
+def copy_file(src, dst):
+    """Copy of publish/publisher_utils_generated.copy_file; keep them identical."""
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+        st = os.fstat(fsrc.fileno())
+        copied = 0
+        try:
+            while copied < st.st_size:
+                if hasattr(os, 'copy_file_range'):
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), st.st_size - copied)
+                else:
+                    n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, st.st_size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError:
+            copied = 0
+        if st.st_size == 0 or copied < st.st_size:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, 1 << 20)
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def stage_file(src, dst):
+    """Hardlink src to dst, falling back to copy_file.
+
+    The wheel build only reads staged files, so sharing the inode is as good
+    as a copy and moves no data. Linking fails across filesystems (a
+    sandboxed input may resolve outside the temp dir's device) or where
+    hardlinks are restricted; those inputs are copied.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        copy_file(src, dst)
+
+
+# Copy of npm_bundler_generated's _made_dirs and ensure_dir; keep them identical
+_made_dirs = set()
+
+
+def ensure_dir(path):
+    """mkdir -p that skips directories already created by this process."""
+    if path in _made_dirs:
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    while path not in _made_dirs and path != path.parent:
+        _made_dirs.add(path)
+        path = path.parent
+
+
+def copy_files(copies):
+    """Stage a {dest: src} mapping concurrently via stage_file.
+
+    Parent directories are created up front so workers never race on mkdir;
+    the link and kernel copy calls release the GIL, so they overlap. Copies are
+    issued in destination order so siblings land in the same directory
+    back to back instead of in bazel's dependency order.
+    """
+    dests = sorted(copies)
+    for parent in dict.fromkeys(dest.parent for dest in dests):
+        ensure_dir(parent)
+    with ThreadPoolExecutor(max_workers=min(32, 4 * (os.cpu_count() or 1))) as pool:
+        list(pool.map(stage_file, [copies[dest] for dest in dests], dests))
+
+
+def read_manifest(manifest_path):
+    """Read a newline-delimited file list, skipping blank lines."""
+    with open(manifest_path, encoding='utf-8') as f:
+        return [line for line in f.read().splitlines() if line]
+
+
 def create_setup_py(package_name, version):
     """Create setup.py content for the wheel"""
     # Use double braces to escape them in f-string
@@ -89,39 +173,69 @@ global-exclude *.pyo
 """
 
 
-def strip_bazel_path(path):
-    """Strip Bazel-specific prefixes from paths to get clean proto paths"""
-    original = path
+# Per-file path mapping and staging tree output; set from --verbose
+VERBOSE = False
 
-    # Handle bazel-out paths (e.g., bazel-out/k8-fastbuild/bin/...)
-    if path.startswith('bazel-out/'):
-        # Find /bin/ and skip past it
-        bin_idx = path.find('/bin/')
-        if bin_idx > 0:
-            path = path[bin_idx + 5:]  # Skip past "/bin/"
+# Bazel prefixes in one match: everything through the first /bin/ of a
+# bazel-out path, or a leading external/, then any run of ../
+BAZEL_PREFIX_RE = re.compile(r'(?:bazel-out(?=/).*?/bin/|external/)?(?:\.\./)*(.*)', re.DOTALL)
 
-    # Handle external repository paths
-    elif path.startswith('external/'):
-        # Skip the external/ prefix
-        path = path[9:]
 
-    # Handle ../ prefixes that might come from external repos
-    while path.startswith('../'):
-        path = path[3:]
+def strip_bazel_path(path):
+    """Strip Bazel-specific prefixes from paths to get clean proto paths"""
+    stripped = BAZEL_PREFIX_RE.match(path).group(1)
 
     # Handle _virtual_imports paths for proto files
-    if '_virtual_imports/' in path:
-        # Extract the actual proto path after _virtual_imports/*/
-        parts = path.split('_virtual_imports/')
-        if len(parts) > 1:
-            after_virtual = parts[1]
-            # Skip the first directory (import name)
-            slash_idx = after_virtual.find('/')
-            if slash_idx > 0:
-                path = after_virtual[slash_idx + 1:]
+    _, marker, after_virtual = stripped.partition('_virtual_imports/')
+    if marker:
+        # Extract the actual proto path after _virtual_imports/*/, up to any
+        # further _virtual_imports/ segment
+        after_virtual = after_virtual.split('_virtual_imports/', 1)[0]
+        # Skip the first directory (import name)
+        slash_idx = after_virtual.find('/')
+        if slash_idx > 0:
+            stripped = after_virtual[slash_idx + 1:]
+
+    if VERBOSE:
+        print(f"  Path mapping: {path} -> {stripped}")
+    return stripped
+
+
+def build_wheel(project_dir):
+    """Build a wheel for project_dir into project_dir.
+
+    Calls setuptools' PEP 517 backend in-process when setuptools is
+    importable, saving the pip interpreter and the backend subprocess pip
+    spawns per wheel; otherwise runs `pip wheel`. Returns (ok, error_output).
+    """
+    try:
+        from setuptools import build_meta
+        # bdist_wheel ships with setuptools since 70.1; older releases need
+        # the separate `wheel` package, which pip would install for us
+        if importlib.util.find_spec('setuptools.command.bdist_wheel') is None:
+            import wheel  # noqa: F401
+    except ImportError:
+        result = subprocess.run(
+            [sys.executable, "-m", "pip", "wheel", ".", "--wheel-dir", ".", "--no-deps"],
+            cwd=project_dir,
+            capture_output=True,
+            text=True
+        )
+        return result.returncode == 0, result.stderr
 
-    print(f"  Path mapping: {original} -> {path}")
-    return path
+    # The backend builds the project in the current directory; its chatter
+    # is kept for the error message, like pip's captured output
+    log = io.StringIO()
+    cwd = os.getcwd()
+    os.chdir(project_dir)
+    try:
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            build_meta.build_wheel(project_dir)
+    except (Exception, SystemExit) as e:
+        return False, f"{log.getvalue()}{e}"
+    finally:
+        os.chdir(cwd)
+    return True, ''
 
 
 def main():
@@ -132,9 +246,25 @@ def main():
                         help="Path to the bundle's bundle.yaml; the version is read from it at build time")
     parser.add_argument('--py-files', nargs='*', default=[], help='Python files')
     parser.add_argument('--proto-sources', nargs='*', default=[], help='Proto source files')
+    parser.add_argument('--py-files-manifest',
+                        help='File listing Python files, one per line (added to --py-files)')
+    parser.add_argument('--proto-sources-manifest',
+                        help='File listing proto sources, one per line (added to --proto-sources)')
+
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print per-file path mappings and the staging directory tree')
 
     args = parser.parse_args()
 
+    global VERBOSE
+    VERBOSE = args.verbose
+
+    # Manifests keep large file lists out of argv (and clear of ARG_MAX)
+    if args.py_files_manifest:
+        args.py_files += read_manifest(args.py_files_manifest)
+    if args.proto_sources_manifest:
+        args.proto_sources += read_manifest(args.proto_sources_manifest)
+
     # bundle.yaml is the single source of truth for the bundle version.
     args.version = read_bundle_version(args.bundle_yaml)
 
@@ -145,24 +275,20 @@ def main():
     with tempfile.TemporaryDirectory() as tmpdir:
         print(f"Creating Python wheel for {args.package_name}...")
 
+        staging = Path(tmpdir)
+        copies = {}
+        package_dirs = set()
+
         # Copy Python files maintaining structure
         print("Copying Python files...")
+        py_count = 0
         for py_file in args.py_files:
             if os.path.exists(py_file):
                 # Determine relative path with proper stripping
-                dest = strip_bazel_path(py_file)
-
-                dest_path = Path(tmpdir) / dest
-                dest_path.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(py_file, dest_path)
-
-                # Create __init__.py files for all parent directories
-                current = dest_path.parent
-                while current != Path(tmpdir):
-                    init_file = current / "__init__.py"
-                    if not init_file.exists():
-                        init_file.touch()
-                    current = current.parent
+                dest_path = staging / strip_bazel_path(py_file)
+                copies[dest_path] = py_file
+                package_dirs.add(dest_path.parent)
+                py_count += 1
             else:
                 print(f"  WARNING: Python file not found: {py_file}")
 
@@ -177,14 +303,32 @@ def main():
                 dest = strip_bazel_path(src)
 
             if os.path.exists(src):
-                # Copy directly to tmpdir root, not a subdirectory
-                dest_path = Path(tmpdir) / dest
-                dest_path.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(src, dest_path)
+                # Copy directly to tmpdir root, not a subdirectory; a proto
+                # for the same path as an earlier file replaces it
+                copies[staging / dest] = src
                 proto_count += 1
             else:
                 print(f"  WARNING: Proto source file not found: {src}")
 
+        copy_files(copies)
+
+        # Create __init__.py files for all parent directories of Python
+        # files. The upward walk stops at the first directory already
+        # collected, so each directory is visited once however many files
+        # share it. An existing __init__.py may be hardlinked to a bazel
+        # output, so it is left untouched rather than having its mtime bumped.
+        init_dirs = set()
+        for package_dir in package_dirs:
+            current = package_dir
+            while current != staging and current not in init_dirs:
+                init_dirs.add(current)
+                current = current.parent
+        for init_dir in init_dirs:
+            init_path = init_dir / "__init__.py"
+            if not init_path.exists():
+                init_path.touch()
+
+        print(f"  Copied {py_count} Python files")
         print(f"  Copied {proto_count} proto files")
 
         # Create setup.py
@@ -196,29 +340,24 @@ def main():
         (Path(tmpdir) / "MANIFEST.in").write_text(manifest_content)
 
         # Debug: Show what's in the temp directory
-        print("\nContents of wheel staging directory:")
-        for root, dirs, files in os.walk(tmpdir):
-            level = root.replace(tmpdir, '').count(os.sep)
-            indent = ' ' * 2 * level
-            print(f"{indent}{os.path.basename(root)}/")
-            subindent = ' ' * 2 * (level + 1)
-            for file in files[:10]:  # Limit to first 10 files per dir
-                if file.endswith('.proto'):
-                    print(f"{subindent}{file} (PROTO)")
-                elif file.endswith('.py'):
-                    print(f"{subindent}{file}")
+        if VERBOSE:
+            print("\nContents of wheel staging directory:")
+            for root, dirs, files in os.walk(tmpdir):
+                level = root.replace(tmpdir, '').count(os.sep)
+                indent = ' ' * 2 * level
+                print(f"{indent}{os.path.basename(root)}/")
+                subindent = ' ' * 2 * (level + 1)
+                for file in files[:10]:  # Limit to first 10 files per dir
+                    if file.endswith('.proto'):
+                        print(f"{subindent}{file} (PROTO)")
+                    elif file.endswith('.py'):
+                        print(f"{subindent}{file}")
 
         # Build the wheel
         print("\nBuilding wheel...")
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "wheel", ".", "--wheel-dir", ".", "--no-deps"],
-            cwd=tmpdir,
-            capture_output=True,
-            text=True
-        )
-
-        if result.returncode != 0:
-            print(f"Error building wheel: {result.stderr}", file=sys.stderr)
+        ok, error_output = build_wheel(tmpdir)
+        if not ok:
+            print(f"Error building wheel: {error_output}", file=sys.stderr)
             sys.exit(1)
 
         # Find the generated wheel
@@ -230,7 +369,7 @@ def main():
         # Copy to output location
         output_path = Path(args.output)
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(wheels[0], output_path)
+        copy_file(wheels[0], output_path)
 
         print(f"\nSuccessfully created {args.output}")
         print(f"  Package: {args.package_name}")
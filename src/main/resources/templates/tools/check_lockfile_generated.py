@@ -34,64 +34,100 @@ def check_lockfile(target_dir, ci_mode=False):
         else:
             return True, []
 
-    with open(lockfile_path, 'r') as f:
-        try:
-            lockdata = json.load(f)
-        except json.JSONDecodeError as e:
-            return False, [f"package-lock.json is invalid JSON: {e}"]
+    with open(lockfile_path, 'rb') as f:
+        data = f.read()
+
+    # Nearly every lockfile is clean, and every finding quotes a path that
+    # contains "protolake", so a raw substring scan proves the common case
+    # without building any Python objects.
+    if b'protolake' not in data:
+        return True, []
+
+    try:
+        lockdata = json.loads(data)
+    except json.JSONDecodeError as e:
+        return False, [f"package-lock.json is invalid JSON: {e}"]
 
     findings = []
 
     # Check lockfile v2/v3 "packages" field
-    packages = lockdata.get('packages', {})
-    for key, value in packages.items():
+    _check_packages(lockdata.get('packages', {}).items(), findings)
+
+    # Check lockfile v1 "dependencies" field
+    dependencies = lockdata.get('dependencies', {})
+    _check_dependencies(dependencies, findings)
+
+    is_clean = len(findings) == 0
+    return is_clean, findings
+
+
+def _check_packages(items, findings):
+    """Check lockfile v2/v3 (key, value) package entries for protolake entries."""
+    seen_keys = set()
+    for key, value in items:
         if _is_protolake_path(key):
             link_info = " (link: true)" if value.get('link') else ""
             findings.append(f"{key}{link_info}")
+            seen_keys.add(key)
         if isinstance(value, dict):
             resolved = value.get('resolved', '')
             if isinstance(resolved, str) and _is_protolake_resolved(resolved):
-                if key not in [f.split(' ')[0] for f in findings]:
+                if key not in seen_keys:
                     findings.append(f"{key} (resolved: {resolved})")
-
-    # Check lockfile v1 "dependencies" field
-    dependencies = lockdata.get('dependencies', {})
-    _check_dependencies_recursive(dependencies, findings)
-
-    is_clean = len(findings) == 0
-    return is_clean, findings
+                    seen_keys.add(key)
 
 
 def _is_protolake_path(path):
     """Check if a path references protolake workspace."""
+    # One scan rejects the usual entry; the separator checks run only on a hit
+    if 'protolake' not in path:
+        return False
     return '/protolake/' in path or '\\protolake\\' in path or path.startswith('protolake/')
 
 
 def _is_protolake_resolved(resolved):
     """Check if a resolved path points into protolake."""
-    if resolved.startswith('file:'):
+    if resolved.startswith('file:') and 'protolake' in resolved:
         remainder = resolved[5:]
         return '/protolake/' in remainder or '\\protolake\\' in remainder or remainder.startswith('protolake/')
     return False
 
 
-def _check_dependencies_recursive(deps, findings, prefix=""):
-    """Recursively check v1 dependencies for protolake entries."""
+def _check_dependencies(deps, findings):
+    """Walk v1 dependencies depth-first, in file order, for protolake entries.
+
+    Uses an explicit stack of item iterators so deep trees cannot hit the
+    recursion limit; the "parent/child/" prefix is only joined for findings.
+    """
     if not isinstance(deps, dict):
         return
-    for name, info in deps.items():
-        if not isinstance(info, dict):
-            continue
-        version = info.get('version', '')
-        if isinstance(version, str) and _is_protolake_resolved(version):
-            findings.append(f"{prefix}{name} (version: {version})")
-        resolved = info.get('resolved', '')
-        if isinstance(resolved, str) and _is_protolake_resolved(resolved):
-            findings.append(f"{prefix}{name} (resolved: {resolved})")
-        # Recurse into nested dependencies
-        nested = info.get('dependencies', {})
-        if isinstance(nested, dict):
-            _check_dependencies_recursive(nested, findings, prefix=f"{prefix}{name}/")
+    parents = []
+    stack = [iter(deps.items())]
+    while stack:
+        for name, info in stack[-1]:
+            if not isinstance(info, dict):
+                continue
+            version = info.get('version', '')
+            if isinstance(version, str) and _is_protolake_resolved(version):
+                findings.append(f"{_dependency_prefix(parents)}{name} (version: {version})")
+            resolved = info.get('resolved', '')
+            if isinstance(resolved, str) and _is_protolake_resolved(resolved):
+                findings.append(f"{_dependency_prefix(parents)}{name} (resolved: {resolved})")
+            # Descend into nested dependencies before the next sibling
+            nested = info.get('dependencies', {})
+            if isinstance(nested, dict) and nested:
+                parents.append(name)
+                stack.append(iter(nested.items()))
+                break
+        else:
+            stack.pop()
+            if parents:
+                parents.pop()
+
+
+def _dependency_prefix(parents):
+    """Format the nesting prefix for a v1 dependency finding."""
+    return ''.join(f"{name}/" for name in parents)
 
 
 def main():
@@ -9,26 +9,23 @@ Wrapper script that runs Gazelle in two passes:
 import os
 import subprocess
 import sys
+from pathlib import Path
 
 def run_command(cmd, cwd=None):
     """Run a command and return its exit code."""
-    print(f"Running: {' '.join(cmd)}")
-    result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
-    if result.stdout:
-        print(result.stdout)
-    if result.stderr:
-        print(result.stderr, file=sys.stderr)
+    # Flush so the banner is not reordered after the child's inherited output
+    print(f"Running: {' '.join(cmd)}", flush=True)
+    result = subprocess.run(cmd, cwd=cwd)
     return result.returncode
 
 def main():
     workspace_root = os.environ.get('BUILD_WORKSPACE_DIRECTORY', '.')
     if workspace_root == '.':
-        current = os.getcwd()
-        while current != '/':
-            if os.path.exists(os.path.join(current, 'MODULE.bazel')):
-                workspace_root = current
+        cwd = Path.cwd()
+        for candidate in (cwd, *cwd.parents):
+            if (candidate / 'MODULE.bazel').exists():
+                workspace_root = str(candidate)
                 break
-            current = os.path.dirname(current)
 
     print("=== Proto Lake Gazelle Wrapper ===")
     print(f"Workspace root: {workspace_root}")
@@ -9,8 +9,38 @@ for protolake local development. Designed as a reusable CLI tool.
 import json
 import os
 import shutil
+import stat
 import sys
 
+# orjson parses and serialises large monorepo package.json files several
+# times faster than the stdlib; fall back to json when it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _load_package_json(pkg_path):
+    """Parse package.json, raising json.JSONDecodeError if it is invalid."""
+    if orjson is not None:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        with open(pkg_path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(pkg_path, 'r') as f:
+        return json.load(f)
+
+
+def _write_package_json(pkg_path, pkg):
+    """Write package.json with 2-space indentation and a trailing newline."""
+    if orjson is not None:
+        data = orjson.dumps(pkg, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+        with open(pkg_path, 'wb') as f:
+            f.write(data)
+        return
+    # Serialise first, then write once: json.dump issues a write per token
+    with open(pkg_path, 'w') as f:
+        f.write(json.dumps(pkg, indent=2) + '\n')
+
 
 def add_workspace_entry(target_dir, glob="protolake/*"):
     """Add a workspace glob to package.json (idempotent).
@@ -21,16 +51,14 @@ def add_workspace_entry(target_dir, glob="protolake/*"):
         True if entry was added or already present, False on error.
     """
     pkg_path = os.path.join(target_dir, 'package.json')
-    if not os.path.exists(pkg_path):
+    try:
+        pkg = _load_package_json(pkg_path)
+    except FileNotFoundError:
         print(f"Error: package.json not found at {target_dir}", file=sys.stderr)
         return False
-
-    with open(pkg_path, 'r') as f:
-        try:
-            pkg = json.load(f)
-        except json.JSONDecodeError as e:
-            print(f"Error: invalid package.json at {target_dir}: {e}", file=sys.stderr)
-            return False
+    except json.JSONDecodeError as e:
+        print(f"Error: invalid package.json at {target_dir}: {e}", file=sys.stderr)
+        return False
 
     workspaces = pkg.get('workspaces')
 
@@ -56,9 +84,7 @@ def add_workspace_entry(target_dir, glob="protolake/*"):
         print(f"Error: workspaces field is not an array or object in {pkg_path}", file=sys.stderr)
         return False
 
-    with open(pkg_path, 'w') as f:
-        json.dump(pkg, f, indent=2)
-        f.write('\n')
+    _write_package_json(pkg_path, pkg)
 
     return True
 
@@ -71,25 +97,91 @@ def ensure_gitignore(target_dir, entry="protolake/"):
     """
     gitignore_path = os.path.join(target_dir, '.gitignore')
 
-    existing_lines = []
-    if os.path.exists(gitignore_path):
-        with open(gitignore_path, 'r') as f:
-            existing_lines = f.read().splitlines()
+    # One handle for both: 'a+' creates the file if missing, reads from the
+    # start after a seek, and always appends on write
+    with open(gitignore_path, 'a+') as f:
+        f.seek(0)
+        existing = f.read()
 
-    # Check if entry already present
-    if entry in existing_lines:
-        return True
+        # Check if entry already present as a whole line
+        if f"\n{entry}\n" in f"\n{existing}\n":
+            return True
 
-    # Append entry
-    with open(gitignore_path, 'a') as f:
         # Add newline before entry if file doesn't end with one
-        if existing_lines and existing_lines[-1] != '':
-            f.write('\n')
-        f.write(entry + '\n')
+        if existing and not existing.endswith('\n'):
+            f.write(f"\n{entry}\n")
+        else:
+            f.write(entry + '\n')
 
     return True
 
 
+def copy_file(src, dst):
+    """Copy of publish/publisher_utils_generated.copy_file; keep them identical."""
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+        st = os.fstat(fsrc.fileno())
+        copied = 0
+        try:
+            while copied < st.st_size:
+                if hasattr(os, 'copy_file_range'):
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), st.st_size - copied)
+                else:
+                    n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, st.st_size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError:
+            copied = 0
+        if st.st_size == 0 or copied < st.st_size:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, 1 << 20)
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def sync_tree(src, dst):
+    """Make dst a copy of src, copying only files whose size or mtime differ.
+
+    Repeated installs of the same package then cost a stat per unchanged
+    file instead of an rmtree and a full copy. Entries in dst that are no
+    longer in src are removed. Symlinks in src are followed, as copytree does.
+    """
+    stack = [(src, dst)]
+    while stack:
+        src_dir, dst_dir = stack.pop()
+        os.makedirs(dst_dir, exist_ok=True)
+        with os.scandir(dst_dir) as it:
+            stale = {entry.name: entry for entry in it}
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                target = os.path.join(dst_dir, entry.name)
+                current = stale.pop(entry.name, None)
+                if entry.is_dir():
+                    if current is not None and not current.is_dir(follow_symlinks=False):
+                        os.remove(target)
+                    stack.append((entry.path, target))
+                    continue
+                if current is not None:
+                    if current.is_dir(follow_symlinks=False):
+                        shutil.rmtree(target)
+                    else:
+                        if current.is_file(follow_symlinks=False):
+                            st, cur = entry.stat(), current.stat(follow_symlinks=False)
+                            if (st.st_size, st.st_mtime_ns) == (cur.st_size, cur.st_mtime_ns):
+                                continue
+                        # Unlink instead of overwriting: the previous install
+                        # copied the source mode, and bazel outputs are 0444
+                        os.remove(target)
+                copy_file(entry.path, target)
+        for entry in stale.values():
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
+
 def install_package_to_workspace(pkg_dir, package_name, target_dir):
     """Install an extracted npm package into a workspace directory.
 
@@ -108,13 +200,8 @@ def install_package_to_workspace(pkg_dir, package_name, target_dir):
     protolake_dir = os.path.join(target_dir, 'protolake')
     dest_dir = os.path.join(protolake_dir, flat_name)
 
-    # Clean destination if exists
-    if os.path.exists(dest_dir):
-        shutil.rmtree(dest_dir)
-
-    # Copy package
-    os.makedirs(protolake_dir, exist_ok=True)
-    shutil.copytree(pkg_dir, dest_dir)
+    # Copy package, leaving files unchanged since the last install in place
+    sync_tree(pkg_dir, dest_dir)
 
     # Set up workspace entry and .gitignore
     if not add_workspace_entry(target_dir):
@@ -131,15 +218,11 @@ def check_workspace_entry(target_dir, glob="protolake/*"):
         True if entry exists, False otherwise.
     """
     pkg_path = os.path.join(target_dir, 'package.json')
-    if not os.path.exists(pkg_path):
+    try:
+        pkg = _load_package_json(pkg_path)
+    except (FileNotFoundError, json.JSONDecodeError):
         return False
 
-    with open(pkg_path, 'r') as f:
-        try:
-            pkg = json.load(f)
-        except json.JSONDecodeError:
-            return False
-
     workspaces = pkg.get('workspaces')
     if isinstance(workspaces, list):
         return glob in workspaces
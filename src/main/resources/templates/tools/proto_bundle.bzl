@@ -171,19 +171,35 @@ def _py_proto_bundle_impl(ctx):
         transitive = [dep[ProtoInfo].transitive_sources for dep in ctx.attr.proto_deps]
     )
 
+    # File lists go through newline-delimited manifests rather than argv,
+    # which large bundles would push past ARG_MAX
+    py_manifest = ctx.actions.declare_file("{}_py_files.txt".format(ctx.label.name))
+    py_manifest_args = ctx.actions.args()
+    py_manifest_args.set_param_file_format("multiline")
+    py_manifest_args.add_all(py_files)
+    ctx.actions.write(py_manifest, py_manifest_args)
+
+    # Proto sources as src=dest pairs using top-level function
+    proto_manifest = ctx.actions.declare_file("{}_proto_sources.txt".format(ctx.label.name))
+    proto_manifest_args = ctx.actions.args()
+    proto_manifest_args.set_param_file_format("multiline")
+    proto_manifest_args.add_all(proto_sources, map_each = _proto_source_mapper)
+    ctx.actions.write(proto_manifest, proto_manifest_args)
+
     # Use the wheel_builder tool
     args = ctx.actions.args()
     args.add("--output", output_whl)
     args.add("--package-name", ctx.attr.package_name)
     args.add("--bundle-yaml", ctx.file.bundle_yaml.path)
-    args.add_all("--py-files", py_files)
-    # Pass proto sources as src=dest pairs using top-level function
-    args.add_all("--proto-sources", proto_sources,
-                 map_each = _proto_source_mapper)
+    args.add("--py-files-manifest", py_manifest)
+    args.add("--proto-sources-manifest", proto_manifest)
 
     ctx.actions.run(
         outputs = [output_whl],
-        inputs = depset(direct = py_files + [ctx.file.bundle_yaml], transitive = [proto_sources]),
+        inputs = depset(
+            direct = py_files + [ctx.file.bundle_yaml, py_manifest, proto_manifest],
+            transitive = [proto_sources],
+        ),
         executable = ctx.executable._wheel_builder,
         arguments = [args],
         mnemonic = "PyProtoBundle",
@@ -3,14 +3,30 @@
 """NPM publisher for proto bundles - supports multiple local publishing strategies"""
 
 import argparse
+import base64
+import hashlib
+import json
 import os
 import re
 import shutil
 import subprocess
 import sys
+import tarfile
 import tempfile
+import time
+import urllib.error
+import urllib.request
 from pathlib import Path
 
+# Add parent directory to path for utilities
+sys.path.insert(0, str(Path(__file__).parent))
+from publisher_utils_generated import copy_file
+
+
+# bundle.yaml's top-level `version:` line, and the characters a version may use
+VERSION_LINE_RE = re.compile(r"^version:\s*['\"]?([^'\"\s]+)")
+VERSION_RE = re.compile(r'[0-9A-Za-z.+~-]+')
+
 
 def read_bundle_version(bundle_yaml_path):
     """Read the top-level `version:` from a bundle.yaml.
@@ -23,7 +39,7 @@ def read_bundle_version(bundle_yaml_path):
     try:
         with open(bundle_yaml_path, encoding='utf-8') as f:
             for line in f:
-                match = re.match(r"^version:\s*['\"]?([^'\"\s]+)", line)
+                match = line.startswith('version:') and VERSION_LINE_RE.match(line)
                 if match:
                     version = match.group(1)
                     break
@@ -35,66 +51,249 @@ def read_bundle_version(bundle_yaml_path):
         print(f"Error: no top-level 'version:' line found in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
-    if not re.fullmatch(r'[0-9A-Za-z.+~-]+', version):
+    if not VERSION_RE.fullmatch(version):
         print(f"Error: malformed version {version!r} in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
     return version
 
 
-def publish_npm_package(bundle_path, package_name, version):
+# Seconds a registry PUT may stall before it is abandoned, and how often a
+# 5xx or connection failure is retried (with a linear backoff) before the
+# publish fails
+REGISTRY_TIMEOUT = 60
+REGISTRY_RETRIES = 2
+REGISTRY_RETRY_DELAY = 1
+
+
+def publish_to_registry(bundle_path, pkg_dir, registry_url, token):
+    """PUT the bundle tarball to an npm registry, as `npm publish` does.
+
+    Sends the document libnpmpublish builds (the package.json manifest with
+    dist checksums, a `latest` dist-tag, and the tarball as a base64
+    attachment) without starting node and the npm CLI for every bundle.
+    Like npm, transient failures (5xx, refused or timed-out connections) are
+    retried; 4xx answers are final. Returns (ok, error message).
+    """
+    with open(bundle_path, 'rb') as f:
+        tarball = f.read()
+    with open(pkg_dir / 'package.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    name = manifest['name']
+    version = manifest['version']
+    registry_url = registry_url.rstrip('/')
+    tarball_name = f"{name}-{version}.tgz"
+
+    manifest['_id'] = f"{name}@{version}"
+    manifest['dist'] = {
+        'shasum': hashlib.sha1(tarball).hexdigest(),
+        'integrity': 'sha512-' + base64.b64encode(hashlib.sha512(tarball).digest()).decode('ascii'),
+        'tarball': f"{registry_url}/{name}/-/{tarball_name}",
+    }
+    document = {
+        '_id': name,
+        'name': name,
+        'description': manifest.get('description', ''),
+        'dist-tags': {'latest': version},
+        'versions': {version: manifest},
+        '_attachments': {
+            tarball_name: {
+                'content_type': 'application/octet-stream',
+                'data': base64.b64encode(tarball).decode('ascii'),
+                'length': len(tarball),
+            },
+        },
+    }
+
+    # Scoped names keep their '@' but escape the '/' in the package URL
+    req = urllib.request.Request(
+        f"{registry_url}/{name.replace('/', '%2f')}",
+        data=json.dumps(document).encode('utf-8'),
+        method='PUT',
+        headers={
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {token}',
+        },
+    )
+    for attempt in range(REGISTRY_RETRIES + 1):
+        if attempt:
+            time.sleep(REGISTRY_RETRY_DELAY * attempt)
+        try:
+            with urllib.request.urlopen(req, timeout=REGISTRY_TIMEOUT):
+                return True, ''
+        except urllib.error.HTTPError as e:
+            resp_body = e.read().decode('utf-8', errors='replace')
+            error = f"{e.code} {e.reason} {resp_body[:500]}".rstrip()
+            if e.code < 500:
+                break
+        except urllib.error.URLError as e:
+            error = str(e.reason)
+        except OSError as e:
+            # A timeout while reading the response is not wrapped in URLError
+            error = str(e)
+    return False, error
+
+
+def extract_bundle(bundle_path, dest_dir):
+    """Extract a bundle tarball into dest_dir in-process, in one streaming pass.
+
+    Returns False, after reporting the error, when the bundle cannot be read.
+    """
+    try:
+        with tarfile.open(bundle_path, 'r|gz') as tar:
+            # The 'data' filter (where available) refuses members that
+            # would land outside dest_dir
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(dest_dir, filter='data')
+            else:
+                tar.extractall(dest_dir)
+    except (tarfile.TarError, OSError) as e:
+        print(f"Error extracting bundle: {e}")
+        return False
+    return True
+
+
+def npm_global_prefix():
+    """Return npm's global prefix when it is known without running npm.
+
+    Reads $NPM_CONFIG_PREFIX, then a `prefix=` line in ~/.npmrc. Returns None
+    otherwise: npm's built-in default depends on how node was installed, so
+    guessing it could link somewhere npm never looks.
+    """
+    prefix = os.environ.get('NPM_CONFIG_PREFIX') or os.environ.get('npm_config_prefix')
+    if prefix:
+        return os.path.expanduser(prefix)
+    try:
+        with open(Path.home() / '.npmrc', encoding='utf-8') as f:
+            for line in f:
+                key, sep, value = line.partition('=')
+                value = value.strip()
+                if sep and key.strip() == 'prefix' and value and '$' not in value:
+                    return os.path.expanduser(value)
+    except OSError:
+        pass
+    return None
+
+
+def link_package(pkg_dir, package_name):
+    """Symlink pkg_dir into the global node_modules, as `npm link` does.
+
+    For a package without `bin` entries that symlink is all `npm link`
+    leaves behind, so writing it here skips the node startup. Returns False
+    when the package has bins, the global prefix is unknown, the platform is
+    Windows (npm uses junctions there) or the link cannot be written; the
+    caller then runs `npm link` instead.
+    """
+    if os.name == 'nt':
+        return False
+    prefix = npm_global_prefix()
+    if prefix is None:
+        return False
+    try:
+        with open(pkg_dir / 'package.json', encoding='utf-8') as f:
+            if json.load(f).get('bin'):
+                return False
+    except (OSError, ValueError):
+        return False
+
+    # Scoped names (@scope/pkg) nest under the scope directory
+    target = Path(prefix, 'lib', 'node_modules', package_name)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.is_symlink() or target.is_file():
+            target.unlink()
+        elif target.exists():
+            shutil.rmtree(target)
+        os.symlink(pkg_dir, target, target_is_directory=True)
+    except OSError:
+        return False
+    return True
+
+
+def publish_npm_package(bundle_path, package_name, version, publish_mode):
     """Publish NPM package to local registry or npm link"""
 
     # Convert to absolute path before changing cwd for extraction
     bundle_path = os.path.abspath(bundle_path)
 
+    # Modes that never look inside the tarball return before extracting it
+    if publish_mode == 'skip':
+        print(f"JS publishing skipped for {package_name}")
+        print(f"  Use --js-target=<path> for local workspace install")
+        print(f"  Use --npm-registry-url=<url> for remote registry publish")
+        return True  # Success — skipping is intentional
+
+    if publish_mode == 'pack':
+        # Just pack the tarball for manual distribution
+        pack_dir = Path.home() / '.proto-lake' / 'npm-packs'
+        pack_dir.mkdir(parents=True, exist_ok=True)
+
+        pack_name = f"{package_name.replace('/', '-')}-{version}.tgz"
+        dest = pack_dir / pack_name
+        copy_file(bundle_path, dest)
+        print(f"✓ Package saved to: {dest}")
+        print(f"  Install with: npm install {dest}")
+        return True
+
+    if publish_mode == 'file':
+        # Copy to local packages directory. The bundle is extracted next to
+        # its destination and renamed into place, so extraction is the copy
+        packages_dir = Path.home() / '.proto-lake' / 'npm-packages'
+        dest = packages_dir / package_name.replace('/', '-') / version
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(prefix='.', dir=dest.parent) as staging:
+            print(f"Extracting bundle: {bundle_path}")
+            if not extract_bundle(bundle_path, staging):
+                return False
+            package = next(Path(staging).iterdir())
+            # Swap the previous install out into the staging directory, which
+            # removes it on exit, so dest is only missing between two renames
+            previous = Path(staging, '.old')
+            if dest.exists():
+                dest.rename(previous)
+            try:
+                package.rename(dest)
+            except OSError:
+                # Put the previous install back before staging is removed
+                if previous.exists():
+                    previous.rename(dest)
+                raise
+
+        print(f"✓ Package copied to: {dest}")
+        print(f"  Add to package.json: \"{package_name}\": \"file:{dest}\"")
+        return True
+
     with tempfile.TemporaryDirectory() as tmpdir:
-        # Extract bundle
         print(f"Extracting bundle: {bundle_path}")
-        result = subprocess.run(
-            ['tar', 'xzf', bundle_path],
-            cwd=tmpdir,
-            capture_output=True,
-            text=True
-        )
-
-        if result.returncode != 0:
-            print(f"Error extracting bundle: {result.stderr}")
+        if not extract_bundle(bundle_path, tmpdir):
             return False
 
         # Find package directory
         pkg_dir = next(Path(tmpdir).iterdir())
 
-        # Determine publishing mode from environment
-        publish_mode = os.environ.get('NPM_PUBLISH_MODE', 'link')
-
-        if publish_mode == 'skip':
-            print(f"JS publishing skipped for {package_name}")
-            print(f"  Use --js-target=<path> for local workspace install")
-            print(f"  Use --npm-registry-url=<url> for remote registry publish")
-            return True  # Success — skipping is intentional
-
-        elif publish_mode == 'link':
+        if publish_mode == 'link':
             # npm link for local development
-            print(f"Linking package: {package_name}")
-            result = subprocess.run(
-                ['npm', 'link'],
-                cwd=pkg_dir,
-                capture_output=True,
-                text=True
-            )
-            if result.returncode == 0:
+            print(f"Linking package: {package_name}", flush=True)
+            if link_package(pkg_dir, package_name):
+                returncode = 0
+            else:
+                # npm writes its output straight to ours; only the status
+                # is needed
+                returncode = subprocess.run(['npm', 'link'], cwd=pkg_dir).returncode
+            if returncode == 0:
                 print(f"✓ Package linked: {package_name}")
                 print(f"  Use 'npm link {package_name}' in your project")
                 print(f"  Or add to package.json: \"{package_name}\": \"link:{pkg_dir}\"")
             else:
-                print(f"✗ Failed to link: {result.stderr}")
+                print(f"✗ Failed to link: npm exited with status {returncode}")
                 return False
 
         elif publish_mode == 'local-registry':
             # Publish to local registry (e.g., Verdaccio)
             registry_url = os.environ.get('NPM_REGISTRY', 'http://localhost:4873')
-            print(f"Publishing to local registry: {registry_url}")
+            print(f"Publishing to local registry: {registry_url}", flush=True)
 
             # Set registry for this publish
             subprocess.run(
@@ -102,44 +301,14 @@ def publish_npm_package(bundle_path, package_name, version):
                 cwd=pkg_dir
             )
 
-            result = subprocess.run(
-                ['npm', 'publish'],
-                cwd=pkg_dir,
-                capture_output=True,
-                text=True
-            )
+            result = subprocess.run(['npm', 'publish'], cwd=pkg_dir)
             if result.returncode == 0:
                 print(f"✓ Published: {package_name}@{version}")
                 print(f"  Install with: npm install {package_name} --registry {registry_url}")
             else:
-                print(f"✗ Failed to publish: {result.stderr}")
+                print(f"✗ Failed to publish: npm exited with status {result.returncode}")
                 return False
 
-        elif publish_mode == 'file':
-            # Copy to local packages directory
-            packages_dir = Path.home() / '.proto-lake' / 'npm-packages'
-            packages_dir.mkdir(parents=True, exist_ok=True)
-
-            dest = packages_dir / package_name.replace('/', '-') / version
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            if dest.exists():
-                shutil.rmtree(dest)
-
-            shutil.copytree(pkg_dir, dest)
-            print(f"✓ Package copied to: {dest}")
-            print(f"  Add to package.json: \"{package_name}\": \"file:{dest}\"")
-
-        elif publish_mode == 'pack':
-            # Just pack the tarball for manual distribution
-            pack_dir = Path.home() / '.proto-lake' / 'npm-packs'
-            pack_dir.mkdir(parents=True, exist_ok=True)
-
-            pack_name = f"{package_name.replace('/', '-')}-{version}.tgz"
-            dest = pack_dir / pack_name
-            shutil.copy2(bundle_path, dest)
-            print(f"✓ Package saved to: {dest}")
-            print(f"  Install with: npm install {dest}")
-
         elif publish_mode == 'workspace':
             import pkg_editor_generated as pkg_editor
 
@@ -196,27 +365,13 @@ def publish_npm_package(bundle_path, package_name, version):
                       file=sys.stderr)
                 return False
 
-            # Write .npmrc with auth token for the registry host
-            from urllib.parse import urlparse
-            parsed = urlparse(registry_url)
-            registry_host = f"//{parsed.netloc}{parsed.path}"
-            npmrc_path = pkg_dir / '.npmrc'
-            npmrc_path.write_text(f"{registry_host}:_authToken={token}\n")
-
             print(f"Publishing to registry: {registry_url}")
-            result = subprocess.run(
-                ['npm', 'publish', f'--registry={registry_url}'],
-                cwd=pkg_dir,
-                capture_output=True,
-                text=True
-            )
-            if result.returncode == 0:
+            ok, error = publish_to_registry(bundle_path, pkg_dir, registry_url, token)
+            if ok:
                 print(f"✓ Published: {package_name}@{version}")
                 print(f"  Install with: npm install {package_name} --registry {registry_url}")
             else:
-                print(f"✗ Failed to publish: {result.stderr}")
-                if result.stdout:
-                    print(f"  stdout: {result.stdout}")
+                print(f"✗ Failed to publish: {error}")
                 return False
 
         else:
@@ -296,7 +451,7 @@ Examples:
     mode = os.environ.get('NPM_PUBLISH_MODE', 'link')
     print(f"Publishing mode: {mode}")
 
-    success = publish_npm_package(args.bundle_path, args.package_name, args.version)
+    success = publish_npm_package(args.bundle_path, args.package_name, args.version, mode)
     sys.exit(0 if success else 1)
 
 
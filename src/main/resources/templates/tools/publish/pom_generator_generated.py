@@ -21,7 +21,12 @@ The actual upload (HTTP PUT to AR, checksums, retries) is handled by
 import argparse
 import re
 import sys
-import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+
+# bundle.yaml's top-level `version:` line, and the characters a version may use
+VERSION_LINE_RE = re.compile(r"^version:\s*['\"]?([^'\"\s]+)")
+VERSION_RE = re.compile(r'[0-9A-Za-z.+~-]+')
 
 
 def read_bundle_version(bundle_yaml_path):
@@ -35,7 +40,7 @@ def read_bundle_version(bundle_yaml_path):
     try:
         with open(bundle_yaml_path, encoding='utf-8') as f:
             for line in f:
-                match = re.match(r"^version:\s*['\"]?([^'\"\s]+)", line)
+                match = line.startswith('version:') and VERSION_LINE_RE.match(line)
                 if match:
                     version = match.group(1)
                     break
@@ -47,44 +52,54 @@ def read_bundle_version(bundle_yaml_path):
         print(f"Error: no top-level 'version:' line found in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
-    if not re.fullmatch(r'[0-9A-Za-z.+~-]+', version):
+    if not VERSION_RE.fullmatch(version):
         print(f"Error: malformed version {version!r} in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
     return version
 
 
+# The POM has a fixed shape, so it is rendered from a template rather than
+# built and serialised as an ElementTree. Same markup ElementTree emitted:
+# no whitespace between elements, text escaped for &, < and >.
+POM_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<project xmlns="http://maven.apache.org/POM/4.0.0"'
+    ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+    ' xsi:schemaLocation="http://maven.apache.org/POM/4.0.0'
+    ' http://maven.apache.org/xsd/maven-4.0.0.xsd">'
+    '<modelVersion>4.0.0</modelVersion>'
+    '<groupId>{group_id}</groupId>'
+    '<artifactId>{artifact_id}</artifactId>'
+    '<version>{version}</version>'
+    '<packaging>jar</packaging>'
+    '{description}'
+    '<dependencies>{dependencies}</dependencies>'
+    '</project>'
+)
+DEPENDENCY_TEMPLATE = (
+    '<dependency>'
+    '<groupId>{}</groupId>'
+    '<artifactId>{}</artifactId>'
+    '<version>{}</version>'
+    '</dependency>'
+)
+
+
 def generate_pom(group_id, artifact_id, version, description=None,
                  protobuf_version="4.33.5", grpc_version="1.78.0",
                  extra_deps=None):
-    """Build the POM ElementTree.
+    """Render the POM XML document, declaration included.
 
     extra_deps: iterable of "groupId:artifactId:version" strings for any
     deps beyond the protobuf/grpc baseline (e.g. cross-bundle proto
     libraries). Caller controls ordering.
     """
-    project = ET.Element("project")
-    project.set("xmlns", "http://maven.apache.org/POM/4.0.0")
-    project.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
-    project.set("xsi:schemaLocation",
-                "http://maven.apache.org/POM/4.0.0 "
-                "http://maven.apache.org/xsd/maven-4.0.0.xsd")
-
-    ET.SubElement(project, "modelVersion").text = "4.0.0"
-    ET.SubElement(project, "groupId").text = group_id
-    ET.SubElement(project, "artifactId").text = artifact_id
-    ET.SubElement(project, "version").text = version
-    ET.SubElement(project, "packaging").text = "jar"
-
-    if description:
-        ET.SubElement(project, "description").text = description
-
-    dependencies = ET.SubElement(project, "dependencies")
-
-    _add_dep(dependencies, "com.google.protobuf", "protobuf-java",
-             protobuf_version)
-    _add_dep(dependencies, "io.grpc", "grpc-protobuf", grpc_version)
-    _add_dep(dependencies, "io.grpc", "grpc-stub", grpc_version)
+    dependencies = [
+        _render_dep("com.google.protobuf", "protobuf-java", protobuf_version),
+        _render_dep("io.grpc", "grpc-protobuf", grpc_version),
+        _render_dep("io.grpc", "grpc-stub", grpc_version),
+    ]
 
     for coord in extra_deps or ():
         parts = coord.split(":")
@@ -92,16 +107,20 @@ def generate_pom(group_id, artifact_id, version, description=None,
             raise SystemExit(
                 f"--maven-dep must be 'groupId:artifactId:version', got: {coord!r}"
             )
-        _add_dep(dependencies, *parts)
-
-    return project
+        dependencies.append(_render_dep(*parts))
+
+    return POM_TEMPLATE.format(
+        group_id=escape(group_id),
+        artifact_id=escape(artifact_id),
+        version=escape(version),
+        description=(f"<description>{escape(description)}</description>"
+                     if description else ""),
+        dependencies="".join(dependencies),
+    )
 
 
-def _add_dep(parent, group_id, artifact_id, version):
-    dep = ET.SubElement(parent, "dependency")
-    ET.SubElement(dep, "groupId").text = group_id
-    ET.SubElement(dep, "artifactId").text = artifact_id
-    ET.SubElement(dep, "version").text = version
+def _render_dep(group_id, artifact_id, version):
+    return DEPENDENCY_TEMPLATE.format(escape(group_id), escape(artifact_id), escape(version))
 
 
 def main():
@@ -151,7 +170,7 @@ def main():
 
     version += args.version_suffix
 
-    project = generate_pom(
+    xml_str = generate_pom(
         args.group_id,
         args.artifact_id,
         version,
@@ -161,12 +180,9 @@ def main():
         extra_deps=args.maven_dep,
     )
 
-    xml_str = '<?xml version="1.0" encoding="UTF-8"?>\n' + \
-              ET.tostring(project, encoding="unicode", method="xml")
-
     if args.out:
-        with open(args.out, "w", encoding="utf-8") as f:
-            f.write(xml_str)
+        with open(args.out, "wb") as f:
+            f.write(xml_str.encode("utf-8"))
     else:
         sys.stdout.write(xml_str)
 
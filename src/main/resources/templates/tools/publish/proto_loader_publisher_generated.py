@@ -8,14 +8,26 @@ to resolve imports from filesystem paths.
 """
 
 import argparse
+import contextlib
+import io
 import json
 import os
+import posixpath
 import re
 import shutil
+import subprocess
 import sys
 import tarfile
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlparse
+
+
+# bundle.yaml's top-level `version:` line, and the characters a version may use
+VERSION_LINE_RE = re.compile(r"^version:\s*['\"]?([^'\"\s]+)")
+VERSION_RE = re.compile(r'[0-9A-Za-z.+~-]+')
 
 
 def read_bundle_version(bundle_yaml_path):
@@ -29,7 +41,7 @@ def read_bundle_version(bundle_yaml_path):
     try:
         with open(bundle_yaml_path, encoding='utf-8') as f:
             for line in f:
-                match = re.match(r"^version:\s*['\"]?([^'\"\s]+)", line)
+                match = line.startswith('version:') and VERSION_LINE_RE.match(line)
                 if match:
                     version = match.group(1)
                     break
@@ -41,62 +53,16 @@ def read_bundle_version(bundle_yaml_path):
         print(f"Error: no top-level 'version:' line found in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
-    if not re.fullmatch(r'[0-9A-Za-z.+~-]+', version):
+    if not VERSION_RE.fullmatch(version):
         print(f"Error: malformed version {version!r} in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
     return version
 
 
-def create_proto_loader_package(output_path, package_name, version, proto_sources):
-    """Create an npm package containing raw .proto files and a helper module.
-
-    Args:
-        output_path: Path to write the output .tgz file
-        package_name: NPM package name (e.g., '@example/service-proto-loader')
-        version: Package version
-        proto_sources: List of 'src=dest' pairs for proto files
-    """
-    output_path = os.path.abspath(output_path)
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        pkg_dir = os.path.join(tmpdir, 'package')
-        proto_dir = os.path.join(pkg_dir, 'proto')
-        os.makedirs(proto_dir, exist_ok=True)
-
-        # Copy proto files preserving directory structure
-        for source_pair in proto_sources:
-            if '=' in source_pair:
-                src, dest = source_pair.split('=', 1)
-            else:
-                src = source_pair
-                dest = source_pair
-
-            dest_path = os.path.join(proto_dir, dest)
-            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-            shutil.copy2(src, dest_path)
-
-        # Create package.json
-        package_json = {
-            'name': package_name,
-            'version': version,
-            'description': f'Raw proto files for {package_name} - use with @grpc/proto-loader',
-            'main': 'index.js',
-            'types': 'index.d.ts',
-            'files': ['proto/', 'index.js', 'index.d.ts'],
-            'peerDependencies': {
-                '@grpc/grpc-js': '>=1.8.0',
-                '@grpc/proto-loader': '>=0.7.0',
-            },
-            'keywords': ['protobuf', 'grpc', 'proto-loader'],
-        }
-
-        with open(os.path.join(pkg_dir, 'package.json'), 'w') as f:
-            json.dump(package_json, f, indent=2)
-            f.write('\n')
-
-        # Create index.js - exports PROTO_ROOT and getProtoPath helper
-        index_js = '''\
+# index.js exports PROTO_ROOT and the getProtoPath helper; formatted with
+# the package name for its usage examples
+INDEX_JS_TEMPLATE = '''\
 "use strict";
 const path = require("path");
 
@@ -127,13 +93,10 @@ function getProtoPath(...paths) {{
 }}
 
 module.exports = {{ PROTO_ROOT, getProtoPath }};
-'''.format(package_name=package_name)
-
-        with open(os.path.join(pkg_dir, 'index.js'), 'w') as f:
-            f.write(index_js)
+'''
 
-        # Create index.d.ts - TypeScript declarations
-        index_dts = '''\
+# index.d.ts holds TypeScript declarations and does not vary per package
+INDEX_DTS = b'''\
 /**
  * Absolute path to the proto/ directory in this package.
  * Use as an includeDirs entry for @grpc/proto-loader.
@@ -148,61 +111,189 @@ export declare const PROTO_ROOT: string;
 export declare function getProtoPath(...paths: string[]): string;
 '''
 
-        with open(os.path.join(pkg_dir, 'index.d.ts'), 'w') as f:
-            f.write(index_dts)
 
-        # Create .tgz package
-        with tarfile.open(output_path, 'w:gz') as tar:
-            tar.add(pkg_dir, arcname='package')
+def _add_dir(tar, name, mtime):
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.DIRTYPE
+    info.mode = 0o755
+    info.mtime = mtime
+    tar.addfile(info)
+
+
+def _add_bytes(tar, name, data, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o644
+    info.mtime = mtime
+    tar.addfile(info, io.BytesIO(data))
+
+
+@contextlib.contextmanager
+def open_tarball(output_path):
+    """Open output_path as a gzipped tarball for writing, yielding the TarFile.
+
+    Compression is piped through pigz across all cores when it is on PATH;
+    otherwise the stdlib gzip writer runs at level 1, several times faster
+    than tarfile's default level 9 for a slightly larger archive. Members
+    added by path are dereferenced: bazel hands over symlinked sources, and
+    the archive must hold the files they point to.
+    """
+    pigz = shutil.which('pigz')
+    if pigz is None:
+        # 1 MiB output buffer: tarfile/gzip otherwise hit the 8 KiB default
+        with open(output_path, 'wb', buffering=1 << 20) as out, \
+                tarfile.open(fileobj=out, mode='w:gz', compresslevel=1,
+                             dereference=True) as tar:
+            yield tar
+        return
+
+    with open(output_path, 'wb') as out:
+        proc = subprocess.Popen([pigz, '-p', str(os.cpu_count() or 1), '-c'],
+                                stdin=subprocess.PIPE, stdout=out)
+        try:
+            with tarfile.open(fileobj=proc.stdin, mode='w|', dereference=True) as tar:
+                yield tar
+        finally:
+            proc.stdin.close()
+            returncode = proc.wait()
+    if returncode != 0:
+        raise OSError(f"pigz exited with status {returncode}")
+
+
+def create_proto_loader_package(output_path, package_name, version, proto_sources):
+    """Create an npm package containing raw .proto files and a helper module.
+
+    The package is written straight into the .tgz: generated files from
+    memory, protos from their source paths, with no staging directory.
+
+    Args:
+        output_path: Path to write the output .tgz file
+        package_name: NPM package name (e.g., '@example/service-proto-loader')
+        version: Package version
+        proto_sources: List of 'src=dest' pairs for proto files
+    """
+    output_path = os.path.abspath(output_path)
+    mtime = int(time.time())
+
+    # Create package.json
+    package_json = {
+        'name': package_name,
+        'version': version,
+        'description': f'Raw proto files for {package_name} - use with @grpc/proto-loader',
+        'main': 'index.js',
+        'types': 'index.d.ts',
+        'files': ['proto/', 'index.js', 'index.d.ts'],
+        'peerDependencies': {
+            '@grpc/grpc-js': '>=1.8.0',
+            '@grpc/proto-loader': '>=0.7.0',
+        },
+        'keywords': ['protobuf', 'grpc', 'proto-loader'],
+    }
+
+    with open_tarball(output_path) as tar:
+        _add_dir(tar, 'package', mtime)
+        _add_bytes(tar, 'package/package.json',
+                   (json.dumps(package_json, indent=2) + '\n').encode('utf-8'), mtime)
+        _add_bytes(tar, 'package/index.js',
+                   INDEX_JS_TEMPLATE.format(package_name=package_name).encode('utf-8'), mtime)
+        _add_bytes(tar, 'package/index.d.ts', INDEX_DTS, mtime)
+
+        # Add proto files preserving directory structure, with an entry for
+        # each directory ahead of its first file
+        _add_dir(tar, 'package/proto', mtime)
+        added_dirs = {'', 'package', 'package/proto'}
+        for source_pair in proto_sources:
+            if '=' in source_pair:
+                src, dest = source_pair.split('=', 1)
+            else:
+                src = source_pair
+                dest = source_pair
+
+            arcname = posixpath.normpath(f'package/proto/{dest}')
+            missing_dirs = []
+            parent = posixpath.dirname(arcname)
+            while parent not in added_dirs:
+                added_dirs.add(parent)
+                missing_dirs.append(parent)
+                parent = posixpath.dirname(parent)
+            for dir_name in reversed(missing_dirs):
+                _add_dir(tar, dir_name, mtime)
+            tar.add(src, arcname=arcname, recursive=False)
 
     print(f"Created proto-loader package: {output_path}")
     return True
 
 
+def extract_bundle(bundle_path, dest_dir):
+    """Extract a bundle tarball into dest_dir in-process, in one streaming pass.
+
+    Returns False, after reporting the error, when the bundle cannot be read.
+    """
+    try:
+        with tarfile.open(bundle_path, 'r|gz') as tar:
+            # The 'data' filter (where available) refuses members that
+            # would land outside dest_dir
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(dest_dir, filter='data')
+            else:
+                tar.extractall(dest_dir)
+    except (tarfile.TarError, OSError) as e:
+        print(f"Error extracting bundle: {e}")
+        return False
+    return True
+
+
 def publish_proto_loader_package(bundle_path, package_name, version):
     """Publish the proto-loader package using the same modes as npm_publisher."""
 
     bundle_path = os.path.abspath(bundle_path)
 
+    publish_mode = os.environ.get('NPM_PUBLISH_MODE', 'file')
+
+    # Skipping never looks inside the tarball, so return before extracting it
+    if publish_mode == 'skip':
+        print(f"JS publishing skipped for proto-loader package {package_name}")
+        return True
+
+    if publish_mode == 'file':
+        # The bundle is extracted next to its destination and renamed into
+        # place, so extraction is the copy
+        packages_dir = Path.home() / '.proto-lake' / 'npm-packages'
+        dest = packages_dir / package_name.replace('/', '-') / version
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(prefix='.', dir=dest.parent) as staging:
+            if not extract_bundle(bundle_path, staging):
+                return False
+            package = next(Path(staging).iterdir())
+            # Swap the previous install out into the staging directory, which
+            # removes it on exit, so dest is only missing between two renames
+            previous = Path(staging, '.old')
+            if dest.exists():
+                dest.rename(previous)
+            try:
+                package.rename(dest)
+            except OSError:
+                # Put the previous install back before staging is removed
+                if previous.exists():
+                    previous.rename(dest)
+                raise
+
+        print(f"Proto-loader package copied to: {dest}")
+        print(f"  Add to package.json: \"{package_name}\": \"file:{dest}\"")
+        return True
+
     with tempfile.TemporaryDirectory() as tmpdir:
-        # Extract bundle
-        import subprocess
-        result = subprocess.run(
-            ['tar', 'xzf', bundle_path],
-            cwd=tmpdir,
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            print(f"Error extracting bundle: {result.stderr}")
+        if not extract_bundle(bundle_path, tmpdir):
             return False
 
         pkg_dir = next(Path(tmpdir).iterdir())
 
-        publish_mode = os.environ.get('NPM_PUBLISH_MODE', 'file')
-
-        if publish_mode == 'skip':
-            print(f"JS publishing skipped for proto-loader package {package_name}")
-            return True
-
-        elif publish_mode == 'file':
-            packages_dir = Path.home() / '.proto-lake' / 'npm-packages'
-            dest = packages_dir / package_name.replace('/', '-') / version
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            if dest.exists():
-                shutil.rmtree(dest)
-            shutil.copytree(pkg_dir, dest)
-            print(f"Proto-loader package copied to: {dest}")
-            print(f"  Add to package.json: \"{package_name}\": \"file:{dest}\"")
-        elif publish_mode == 'link':
-            result = subprocess.run(
-                ['npm', 'link'],
-                cwd=pkg_dir,
-                capture_output=True,
-                text=True,
-            )
+        if publish_mode == 'link':
+            # npm writes its output straight to ours; only the status is needed
+            result = subprocess.run(['npm', 'link'], cwd=pkg_dir)
             if result.returncode != 0:
-                print(f"Failed to link: {result.stderr}")
+                print(f"Failed to link: npm exited with status {result.returncode}")
                 return False
             print(f"Proto-loader package linked: {package_name}")
         elif publish_mode == 'workspace':
@@ -214,17 +305,26 @@ def publish_proto_loader_package(bundle_path, package_name, version):
                 return True
 
             js_targets = [t.strip() for t in js_targets_str.replace('\n', ',').split(',') if t.strip()]
-            all_ok = True
-            for target_dir in js_targets:
+            valid_targets = []
+            for target_dir in dict.fromkeys(js_targets):
                 if not os.path.exists(os.path.join(target_dir, 'package.json')):
                     print(f"Warning: no package.json at {target_dir}, skipping", file=sys.stderr)
                     continue
-                ok = pkg_editor.install_package_to_workspace(str(pkg_dir), package_name, target_dir)
+                valid_targets.append(target_dir)
+            if not valid_targets:
+                return True
+
+            # Installs into distinct targets touch disjoint trees, so they run
+            # side by side; results are reported in target order
+            with ThreadPoolExecutor(max_workers=min(8, len(valid_targets))) as executor:
+                results = list(executor.map(
+                    lambda target_dir: pkg_editor.install_package_to_workspace(
+                        str(pkg_dir), package_name, target_dir),
+                    valid_targets))
+            for target_dir, ok in zip(valid_targets, results):
                 if ok:
                     print(f"\u2713 Installed proto-loader {package_name} to {target_dir}/protolake/")
-                else:
-                    all_ok = False
-            return all_ok
+            return all(results)
         elif publish_mode == 'registry':
             # Publish to a remote npm registry (e.g., GCP Artifact Registry)
             registry_url = os.environ.get('NPM_REGISTRY_URL', '')
@@ -240,25 +340,20 @@ def publish_proto_loader_package(bundle_path, package_name, version):
                 return False
 
             # Write .npmrc with auth token for the registry host
-            from urllib.parse import urlparse
             parsed = urlparse(registry_url)
             registry_host = f"//{parsed.netloc}{parsed.path}"
             npmrc_path = pkg_dir / '.npmrc'
             npmrc_path.write_text(f"{registry_host}:_authToken={token}\n")
 
-            print(f"Publishing proto-loader package to registry: {registry_url}")
+            print(f"Publishing proto-loader package to registry: {registry_url}", flush=True)
             result = subprocess.run(
                 ['npm', 'publish', f'--registry={registry_url}'],
                 cwd=pkg_dir,
-                capture_output=True,
-                text=True,
             )
             if result.returncode == 0:
                 print(f"Proto-loader package published: {package_name}@{version}")
             else:
-                print(f"Failed to publish: {result.stderr}")
-                if result.stdout:
-                    print(f"  stdout: {result.stdout}")
+                print(f"Failed to publish: npm exited with status {result.returncode}")
                 return False
         else:
             print(f"Unknown publish mode: {publish_mode}")
@@ -3,7 +3,11 @@
 """Common utilities for Proto Lake publishers"""
 
 import hashlib
+import mmap
 import os
+import shutil
+import stat
+from datetime import datetime
 from pathlib import Path
 
 
@@ -12,36 +16,96 @@ def ensure_directory_exists(path):
     Path(path).mkdir(parents=True, exist_ok=True)
 
 
+def copy_file(src, dst):
+    """Copy src to dst with mode and timestamps, like shutil.copy2.
+
+    The bytes move in-kernel via os.copy_file_range (os.sendfile on older
+    Pythons). Like shutil, the fast path is only trusted when it delivers
+    the whole file: an empty stat size (procfs reports 0 for files with
+    content), a 0 return before the end (some FUSE and overlay mounts) or a
+    refusal restarts the copy as a copyfileobj loop with a 1 MiB buffer
+    instead of the 64 KiB shutil default.
+    """
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+        st = os.fstat(fsrc.fileno())
+        copied = 0
+        try:
+            while copied < st.st_size:
+                if hasattr(os, 'copy_file_range'):
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), st.st_size - copied)
+                else:
+                    n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, st.st_size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError:
+            copied = 0
+        if st.st_size == 0 or copied < st.st_size:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, 1 << 20)
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+# Slice size when feeding several digests from one mapping: small enough
+# that each slice is still in cache when the next digest reads it
+CHECKSUM_CHUNK_SIZE = 1 << 20
+
+
 def calculate_checksum(file_path, algorithm='sha256'):
     """Calculate checksum of a file."""
-    hash_func = hashlib.new(algorithm)
+    return calculate_checksums(file_path, (algorithm,))[algorithm]
+
+
+def calculate_checksums(file_path, algorithms=('md5', 'sha1')):
+    """Calculate several checksums of a file in a single pass.
+
+    The file is mmapped and fed to every digest slice by slice, so it is
+    read once however many algorithms are requested, and hashing runs in C.
+    Empty files (which cannot be mapped) and unmappable special files fall
+    back to a read loop. Returns {algorithm: hexdigest}.
+    """
+    hash_funcs = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
 
     with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b''):
-            hash_func.update(chunk)
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            mm = None
+
+        if mm is None:
+            for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b''):
+                for hash_func in hash_funcs.values():
+                    hash_func.update(chunk)
+        else:
+            with mm, memoryview(mm) as view:
+                for offset in range(0, len(view), CHECKSUM_CHUNK_SIZE):
+                    with view[offset:offset + CHECKSUM_CHUNK_SIZE] as chunk:
+                        for hash_func in hash_funcs.values():
+                            hash_func.update(chunk)
 
-    return hash_func.hexdigest()
+    return {algorithm: hash_func.hexdigest() for algorithm, hash_func in hash_funcs.items()}
 
 
-def generate_checksums(file_path):
-    """Generate MD5 and SHA1 checksums for a file."""
-    md5_checksum = calculate_checksum(file_path, 'md5')
-    sha1_checksum = calculate_checksum(file_path, 'sha1')
+# Sidecars written next to maven artifacts. Resolvers that understand them
+# also accept .sha256/.sha512, which hash faster on CPUs with SHA extensions
+MAVEN_CHECKSUM_ALGORITHMS = ('md5', 'sha1')
 
-    # Write checksum files
-    md5_path = f"{file_path}.md5"
-    sha1_path = f"{file_path}.sha1"
 
-    with open(md5_path, 'w') as f:
-        f.write(md5_checksum)
+def generate_checksums(file_path, algorithms=MAVEN_CHECKSUM_ALGORITHMS):
+    """Generate checksum sidecars (<file>.<algorithm>) for a file.
 
-    with open(sha1_path, 'w') as f:
-        f.write(sha1_checksum)
+    All digests come from one read of the file. Returns {algorithm: hexdigest}.
+    """
+    checksums = calculate_checksums(file_path, algorithms)
 
-    return {
-        'md5': md5_checksum,
-        'sha1': sha1_checksum
-    }
+    # Write checksum files; hex digests are ASCII, so skip the text layer
+    for algorithm, checksum in checksums.items():
+        Path(f"{file_path}.{algorithm}").write_bytes(checksum.encode('ascii'))
+
+    return checksums
 
 
 def create_maven_metadata(group_id, artifact_id, versions, latest_version):
@@ -64,37 +128,82 @@ def create_maven_metadata(group_id, artifact_id, versions, latest_version):
 """
 
 
+# maven-metadata <lastUpdated> format
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S'
+
+
 def get_timestamp():
     """Get current timestamp in Maven format."""
-    from datetime import datetime
-    return datetime.now().strftime('%Y%m%d%H%M%S')
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
 
 
-def update_local_maven_metadata(repo_path, group_id, artifact_id, new_version):
+def read_metadata_versioning(metadata_file):
+    """Read <versioning> from maven-metadata as (versions, latest, release).
+
+    versions holds every <version> under <versioning>; latest and release
+    are the texts of its direct children of those names, or None. Streams
+    the file with iterparse and clears each element as it closes, so no
+    tree is kept however long the version history grows. Only the first
+    <versioning> child of the root is read.
+    """
+    # Imported here: the pypi and npm publishers load this module but never
+    # read metadata, so they should not pay for loading ElementTree
+    import xml.etree.ElementTree as ET
+
+    versions = set()
+    versioning = {}
+    depth = 0
+    in_versioning = False
+    versioning_seen = False
+    for event, elem in ET.iterparse(metadata_file, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and elem.tag == 'versioning' and not versioning_seen:
+                in_versioning = versioning_seen = True
+            continue
+        if in_versioning:
+            if depth == 2:
+                in_versioning = False
+            elif elem.tag == 'version':
+                versions.add(elem.text)
+            elif depth == 3 and elem.tag in ('latest', 'release'):
+                versioning.setdefault(elem.tag, elem.text)
+        depth -= 1
+        elem.clear()
+    return versions, versioning.get('latest'), versioning.get('release')
+
+
+# Maven repository layout: a group ID's dots become directory separators
+GROUP_ID_TO_PATH = str.maketrans('.', '/')
+
+
+def update_local_maven_metadata(repo_path, group_id, artifact_id, new_version,
+                                checksum_algorithms=MAVEN_CHECKSUM_ALGORITHMS):
     """Update maven-metadata.xml in local repository."""
     # Convert group ID to path
-    group_parts = group_id.split('.')
-    artifact_base = Path(repo_path) / os.path.join(*group_parts) / artifact_id
+    artifact_base = Path(repo_path, group_id.translate(GROUP_ID_TO_PATH), artifact_id)
     metadata_file = artifact_base / "maven-metadata-local.xml"
 
     # Read existing versions
     versions = set()
-    if metadata_file.exists():
-        # Parse existing metadata
-        import xml.etree.ElementTree as ET
-        tree = ET.parse(metadata_file)
-        root = tree.getroot()
-        versioning = root.find('versioning')
-        if versioning:
-            for version in versioning.findall('.//version'):
-                versions.add(version.text)
+    try:
+        versions, latest, release = read_metadata_versioning(metadata_file)
+    except FileNotFoundError:
+        pass
+    else:
+        # Republishing the current version: the rewrite would only bump
+        # <lastUpdated>, so keep the file and its checksums as they are
+        if (new_version in versions and latest == release == new_version
+                and all(Path(f"{metadata_file}.{algorithm}").exists()
+                        for algorithm in checksum_algorithms)):
+            return
 
     # Add new version
     versions.add(new_version)
 
     # Generate new metadata
     metadata_content = create_maven_metadata(group_id, artifact_id, versions, new_version)
-    metadata_file.write_text(metadata_content)
+    metadata_file.write_bytes(metadata_content.encode('utf-8'))
 
     # Generate checksums for metadata
-    generate_checksums(metadata_file)
\ No newline at end of file
+    generate_checksums(metadata_file, checksum_algorithms)
\ No newline at end of file
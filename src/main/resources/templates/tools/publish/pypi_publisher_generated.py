@@ -12,7 +12,12 @@ from pathlib import Path
 
 # Add parent directory to path for utilities
 sys.path.insert(0, str(Path(__file__).parent))
-from publisher_utils_generated import ensure_directory_exists, calculate_checksum
+from publisher_utils_generated import ensure_directory_exists, calculate_checksum, copy_file
+
+
+# bundle.yaml's top-level `version:` line, and the characters a version may use
+VERSION_LINE_RE = re.compile(r"^version:\s*['\"]?([^'\"\s]+)")
+VERSION_RE = re.compile(r'[0-9A-Za-z.+~-]+')
 
 
 def read_bundle_version(bundle_yaml_path):
@@ -26,7 +31,7 @@ def read_bundle_version(bundle_yaml_path):
     try:
         with open(bundle_yaml_path, encoding='utf-8') as f:
             for line in f:
-                match = re.match(r"^version:\s*['\"]?([^'\"\s]+)", line)
+                match = line.startswith('version:') and VERSION_LINE_RE.match(line)
                 if match:
                     version = match.group(1)
                     break
@@ -38,7 +43,7 @@ def read_bundle_version(bundle_yaml_path):
         print(f"Error: no top-level 'version:' line found in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
-    if not re.fullmatch(r'[0-9A-Za-z.+~-]+', version):
+    if not VERSION_RE.fullmatch(version):
         print(f"Error: malformed version {version!r} in {bundle_yaml_path}",
               file=sys.stderr)
         sys.exit(1)
@@ -72,7 +77,7 @@ def publish_to_local_repo(wheel_path, package_name, version, repo_path):
     distribution = normalized_name.replace('-', '_')
     wheel_name = f"{distribution}-{version.replace('-', '_')}-py3-none-any.whl"
     target_wheel = package_dir / wheel_name
-    shutil.copy2(wheel_path, target_wheel)
+    copy_file(wheel_path, target_wheel)
     print(f"Copied wheel to {target_wheel}")
 
     # Update package index
@@ -87,7 +92,8 @@ def publish_to_local_repo(wheel_path, package_name, version, repo_path):
 def update_package_index(package_dir):
     """Create/update package-specific index.html"""
     # List all wheel files
-    wheel_files = sorted([f for f in os.listdir(package_dir) if f.endswith('.whl')])
+    with os.scandir(package_dir) as entries:
+        wheel_files = sorted(e.name for e in entries if e.name.endswith('.whl'))
 
     # Create index.html
     html_lines = ['<!DOCTYPE html>', '<html>', '<body>']
@@ -96,18 +102,19 @@ def update_package_index(package_dir):
     html_lines.extend(['</body>', '</html>'])
 
     index_path = package_dir / "index.html"
-    index_path.write_text('\n'.join(html_lines))
-    print(f"Updated package index: {index_path}")
+    if write_index(index_path, '\n'.join(html_lines)):
+        print(f"Updated package index: {index_path}")
+    else:
+        print(f"Package index up to date: {index_path}")
 
 
 def update_root_index(repo_path):
     """Update root simple index listing all packages"""
-    # List all package directories
-    packages = []
-    for item in sorted(os.listdir(repo_path)):
-        item_path = repo_path / item
-        if item_path.is_dir() and not item.startswith('.'):
-            packages.append(item)
+    # List all package directories; DirEntry.is_dir() answers from the
+    # directory listing itself, without a stat per entry
+    with os.scandir(repo_path) as entries:
+        packages = sorted(e.name for e in entries
+                          if not e.name.startswith('.') and e.is_dir())
 
     # Create root index.html
     html_lines = ['<!DOCTYPE html>', '<html>', '<body>']
@@ -116,44 +123,66 @@ def update_root_index(repo_path):
     html_lines.extend(['</body>', '</html>'])
 
     index_path = repo_path / "index.html"
-    index_path.write_text('\n'.join(html_lines))
-    print(f"Updated root index: {index_path}")
+    if write_index(index_path, '\n'.join(html_lines)):
+        print(f"Updated root index: {index_path}")
+    else:
+        print(f"Root index up to date: {index_path}")
+
+
+def write_index(index_path, content):
+    """Write an index page unless it already holds exactly this content.
+
+    Republishing a wheel leaves both listings as they were, so the pages are
+    compared rather than rewritten. A new page is written beside the old one
+    and renamed over it, so pip never reads a half-written index and
+    concurrent publishes each leave a complete page. Returns True when the
+    file was written.
+    """
+    data = content.encode('utf-8')
+    try:
+        if index_path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+
+    # Per-process name: created with the usual umask-derived mode, unlike
+    # mkstemp's 0600, and never shared between concurrent publishers
+    tmp_path = index_path.with_name(f".{index_path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return True
 
 
 def publish_to_remote_registry(wheel_path, registry_url, token):
     """Publish wheel to a remote PyPI registry (e.g., GCP Artifact Registry) using twine"""
     registry_url = registry_url.rstrip('/')
 
-    # Try twine first
-    try:
-        result = subprocess.run(
-            ['twine', '--version'],
-            capture_output=True, text=True,
-        )
-        has_twine = result.returncode == 0
-    except FileNotFoundError:
-        has_twine = False
+    # Try twine first. A PATH lookup finds it without spawning
+    # `twine --version`, which pays the whole twine import just to probe
+    twine = shutil.which('twine')
 
-    if has_twine:
-        print(f"Uploading with twine to: {registry_url}")
+    if twine is not None:
+        print(f"Uploading with twine to: {registry_url}", flush=True)
         env = os.environ.copy()
         env['TWINE_USERNAME'] = 'oauth2accesstoken'
         env['TWINE_PASSWORD'] = token
         result = subprocess.run(
             [
-                'twine', 'upload',
+                twine, 'upload',
                 '--repository-url', registry_url,
                 '--non-interactive',
                 wheel_path,
             ],
-            capture_output=True,
-            text=True,
             env=env,
         )
         if result.returncode != 0:
-            print(f"Error uploading with twine: {result.stderr}", file=sys.stderr)
-            if result.stdout:
-                print(f"  stdout: {result.stdout}", file=sys.stderr)
+            # twine's own output went straight to the terminal
+            print(f"Error uploading with twine: exit status {result.returncode}",
+                  file=sys.stderr)
             sys.exit(1)
         print(f"Successfully uploaded: {os.path.basename(wheel_path)}")
     else:
@@ -163,33 +192,43 @@ def publish_to_remote_registry(wheel_path, registry_url, token):
         import urllib.error
 
         wheel_name = os.path.basename(wheel_path)
-        with open(wheel_path, 'rb') as f:
-            wheel_data = f.read()
 
-        # Construct multipart form data for PyPI upload
+        # Construct multipart form data for PyPI upload. The wheel itself is
+        # streamed from disk between the preamble and the closing boundary,
+        # so memory use does not grow with the wheel
         boundary = '----ProtolakeUploadBoundary'
         fields = [
             (':action', 'file_upload'),
             ('protocol_version', '1'),
         ]
-        body = b''
+        preamble = bytearray()
         for field_name, field_value in fields:
-            body += f'--{boundary}\r\n'.encode()
-            body += f'Content-Disposition: form-data; name="{field_name}"\r\n\r\n'.encode()
-            body += f'{field_value}\r\n'.encode()
+            preamble += f'--{boundary}\r\n'.encode()
+            preamble += f'Content-Disposition: form-data; name="{field_name}"\r\n\r\n'.encode()
+            preamble += f'{field_value}\r\n'.encode()
+
+        preamble += f'--{boundary}\r\n'.encode()
+        preamble += f'Content-Disposition: form-data; name="content"; filename="{wheel_name}"\r\n'.encode()
+        preamble += b'Content-Type: application/octet-stream\r\n\r\n'
+        epilogue = f'\r\n--{boundary}--\r\n'.encode()
+
+        def body():
+            yield bytes(preamble)
+            with open(wheel_path, 'rb') as f:
+                yield from iter(lambda: f.read(1 << 20), b'')
+            yield epilogue
 
-        body += f'--{boundary}\r\n'.encode()
-        body += f'Content-Disposition: form-data; name="content"; filename="{wheel_name}"\r\n'.encode()
-        body += b'Content-Type: application/octet-stream\r\n\r\n'
-        body += wheel_data
-        body += f'\r\n--{boundary}--\r\n'.encode()
+        # An explicit length keeps http.client from falling back to chunked
+        # transfer encoding for the generator body
+        content_length = len(preamble) + os.path.getsize(wheel_path) + len(epilogue)
 
         req = urllib.request.Request(
             registry_url + '/',
-            data=body,
+            data=body(),
             method='POST',
             headers={
                 'Content-Type': f'multipart/form-data; boundary={boundary}',
+                'Content-Length': str(content_length),
                 'Authorization': f'Bearer {token}',
             },
         )
@@ -0,0 +1,213 @@
+package space.cohub.vdp.protolake.publish;
+
+import com.fasterxml.jackson.databind.JsonNode;
+import com.fasterxml.jackson.databind.ObjectMapper;
+import com.sun.net.httpserver.HttpExchange;
+import com.sun.net.httpserver.HttpServer;
+import org.apache.commons.compress.archivers.tar.TarArchiveEntry;
+import org.apache.commons.compress.archivers.tar.TarArchiveOutputStream;
+import org.apache.commons.compress.compressors.gzip.GzipCompressorOutputStream;
+import org.junit.jupiter.api.AfterEach;
+import org.junit.jupiter.api.BeforeEach;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.net.InetSocketAddress;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.security.MessageDigest;
+import java.util.Base64;
+import java.util.HexFormat;
+import java.util.List;
+import java.util.Map;
+import java.util.Queue;
+import java.util.concurrent.ConcurrentLinkedQueue;
+import java.util.concurrent.CopyOnWriteArrayList;
+import java.util.concurrent.TimeUnit;
+
+import static org.assertj.core.api.Assertions.assertThat;
+import static org.junit.jupiter.api.Assumptions.assumeTrue;
+
+/**
+ * Executes the npm_publisher template in registry mode against a local HTTP
+ * server and pins the request {@code npm publish} would send: a PUT to the
+ * package URL (scoped names keep the {@code @} and escape the {@code /} as
+ * {@code %2f}), a Bearer token, the sha1/sha512 dist checksums, and the
+ * tarball as a base64 attachment. Also pins the retry policy: a 5xx is
+ * retried, a 4xx is final.
+ *
+ * <p>Skipped when {@code python3} is not on the PATH (the script is stdlib-only,
+ * any python3 works).
+ */
+class NpmPublisherScriptTest {
+
+    private static final String TEMPLATE_DIR = "templates/tools/publish/";
+    private static final String PACKAGE_NAME = "@company/user-proto";
+    private static final String TOKEN = "test-token";
+    private static final ObjectMapper JSON = new ObjectMapper();
+
+    @TempDir
+    Path tempDir;
+
+    private Path script;
+    private Path bundle;
+    private HttpServer server;
+    private final Queue<Integer> responseCodes = new ConcurrentLinkedQueue<>();
+    private final List<RecordedRequest> requests = new CopyOnWriteArrayList<>();
+
+    @BeforeEach
+    void setUp() throws Exception {
+        assumeTrue(pythonAvailable(), "python3 not available on PATH");
+
+        // Stage the script next to its publisher_utils import, as in a lake's tools/
+        Path tools = Files.createDirectories(tempDir.resolve("tools"));
+        script = copyTemplate("npm_publisher_generated.py", tools);
+        copyTemplate("publisher_utils_generated.py", tools);
+        bundle = writeBundle(tempDir.resolve("user_js_bundle.tgz"),
+                "{\"name\": \"" + PACKAGE_NAME + "\", \"version\": \"1.2.3\"}");
+
+        server = HttpServer.create(new InetSocketAddress("127.0.0.1", 0), 0);
+        server.createContext("/", this::handle);
+        server.start();
+    }
+
+    @AfterEach
+    void tearDown() {
+        if (server != null) {
+            server.stop(0);
+        }
+    }
+
+    @Test
+    void registry_putsLibnpmpublishDocument_toEscapedScopedPackageUrl() throws Exception {
+        responseCodes.add(201);
+
+        ProcessResult result = runPublisher();
+
+        assertThat(result.exitCode).as("publisher output:\n%s", result.output).isZero();
+        assertThat(requests).hasSize(1);
+        RecordedRequest request = requests.get(0);
+        assertThat(request.method).isEqualTo("PUT");
+        assertThat(request.rawPath).isEqualTo("/npm/@company%2fuser-proto");
+        assertThat(request.authorization).isEqualTo("Bearer " + TOKEN);
+
+        byte[] tarball = Files.readAllBytes(bundle);
+        JsonNode document = JSON.readTree(request.body);
+        assertThat(document.path("dist-tags").path("latest").asText()).isEqualTo("1.2.3");
+        JsonNode dist = document.path("versions").path("1.2.3").path("dist");
+        assertThat(dist.path("shasum").asText())
+                .isEqualTo(HexFormat.of().formatHex(digest("SHA-1", tarball)));
+        assertThat(dist.path("integrity").asText())
+                .isEqualTo("sha512-" + Base64.getEncoder().encodeToString(digest("SHA-512", tarball)));
+
+        JsonNode attachment = document.path("_attachments").path(PACKAGE_NAME + "-1.2.3.tgz");
+        assertThat(Base64.getDecoder().decode(attachment.path("data").asText())).isEqualTo(tarball);
+        assertThat(attachment.path("length").asInt()).isEqualTo(tarball.length);
+    }
+
+    @Test
+    void registry_retriesServerError() throws Exception {
+        responseCodes.add(503);
+        responseCodes.add(201);
+
+        ProcessResult result = runPublisher();
+
+        assertThat(result.exitCode).as("publisher output:\n%s", result.output).isZero();
+        assertThat(requests).hasSize(2);
+    }
+
+    @Test
+    void registry_doesNotRetryClientError() throws Exception {
+        responseCodes.add(403);
+        responseCodes.add(201);
+
+        ProcessResult result = runPublisher();
+
+        assertThat(result.exitCode).isEqualTo(1);
+        assertThat(requests).hasSize(1);
+        assertThat(result.output).contains("403");
+    }
+
+    private void handle(HttpExchange exchange) throws IOException {
+        byte[] body = exchange.getRequestBody().readAllBytes();
+        requests.add(new RecordedRequest(
+                exchange.getRequestMethod(),
+                exchange.getRequestURI().getRawPath(),
+                exchange.getRequestHeaders().getFirst("Authorization"),
+                body));
+        Integer code = responseCodes.poll();
+        byte[] response = "{}".getBytes(StandardCharsets.UTF_8);
+        exchange.sendResponseHeaders(code == null ? 500 : code, response.length);
+        try (OutputStream out = exchange.getResponseBody()) {
+            out.write(response);
+        }
+    }
+
+    /** Writes a gzipped tarball with package/package.json, as the npm bundler lays it out. */
+    private static Path writeBundle(Path target, String packageJson) throws IOException {
+        byte[] content = packageJson.getBytes(StandardCharsets.UTF_8);
+        try (TarArchiveOutputStream tar = new TarArchiveOutputStream(
+                new GzipCompressorOutputStream(Files.newOutputStream(target)))) {
+            TarArchiveEntry entry = new TarArchiveEntry("package/package.json");
+            entry.setSize(content.length);
+            tar.putArchiveEntry(entry);
+            tar.write(content);
+            tar.closeArchiveEntry();
+        }
+        return target;
+    }
+
+    private static byte[] digest(String algorithm, byte[] data) throws Exception {
+        return MessageDigest.getInstance(algorithm).digest(data);
+    }
+
+    private Path copyTemplate(String name, Path targetDir) throws IOException {
+        try (InputStream in = getClass().getClassLoader()
+                .getResourceAsStream(TEMPLATE_DIR + name)) {
+            assertThat(in).as("template resource %s", name).isNotNull();
+            Path target = targetDir.resolve(name);
+            Files.copy(in, target);
+            return target;
+        }
+    }
+
+    private ProcessResult runPublisher() throws Exception {
+        List<String> command = List.of(
+                "python3", script.toString(), bundle.toString(),
+                "--package-name", PACKAGE_NAME,
+                "--version", "1.2.3");
+        ProcessBuilder builder = new ProcessBuilder(command)
+                .directory(tempDir.toFile())
+                .redirectErrorStream(true);
+        Map<String, String> env = builder.environment();
+        env.putAll(Map.of(
+                "NPM_PUBLISH_MODE", "registry",
+                "NPM_REGISTRY_URL", "http://127.0.0.1:" + server.getAddress().getPort() + "/npm/",
+                "NPM_REGISTRY_TOKEN", TOKEN));
+        Process process = builder.start();
+        String output = new String(process.getInputStream().readAllBytes());
+        assertThat(process.waitFor(30, TimeUnit.SECONDS))
+                .as("publisher timed out; output:\n%s", output).isTrue();
+        return new ProcessResult(process.exitValue(), output);
+    }
+
+    private static boolean pythonAvailable() {
+        try {
+            Process process = new ProcessBuilder("python3", "--version").start();
+            return process.waitFor(10, TimeUnit.SECONDS) && process.exitValue() == 0;
+        } catch (IOException | InterruptedException e) {
+            return false;
+        }
+    }
+
+    private record RecordedRequest(String method, String rawPath, String authorization,
+                                   byte[] body) {
+    }
+
+    private record ProcessResult(int exitCode, String output) {
+    }
+}
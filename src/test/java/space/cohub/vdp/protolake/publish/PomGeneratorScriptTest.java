@@ -0,0 +1,113 @@
+package space.cohub.vdp.protolake.publish;
+
+import org.junit.jupiter.api.BeforeEach;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.IOException;
+import java.io.InputStream;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.concurrent.TimeUnit;
+
+import static org.assertj.core.api.Assertions.assertThat;
+import static org.junit.jupiter.api.Assumptions.assumeTrue;
+
+/**
+ * Executes the pom_generator template and pins its output byte for byte. The
+ * POM is rendered from a string template; these bytes are the ones the
+ * ElementTree serialiser it replaced emitted (declaration, no whitespace
+ * between elements, {@code &}, {@code <} and {@code >} escaped), so a
+ * template edit that changes the published POM fails here.
+ *
+ * <p>Skipped when {@code python3} is not on the PATH (the script is stdlib-only,
+ * any python3 works).
+ */
+class PomGeneratorScriptTest {
+
+    private static final String TEMPLATE = "templates/tools/publish/pom_generator_generated.py";
+
+    private static final String EXPECTED_POM = "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+            + "<project xmlns=\"http://maven.apache.org/POM/4.0.0\""
+            + " xmlns:xsi=\"http://www.w3.org/2001/XMLSchema-instance\""
+            + " xsi:schemaLocation=\"http://maven.apache.org/POM/4.0.0"
+            + " http://maven.apache.org/xsd/maven-4.0.0.xsd\">"
+            + "<modelVersion>4.0.0</modelVersion>"
+            + "<groupId>com.company.proto</groupId>"
+            + "<artifactId>user-proto</artifactId>"
+            + "<version>1.2.3</version>"
+            + "<packaging>jar</packaging>"
+            + "<description>User &amp; account protos</description>"
+            + "<dependencies>"
+            + "<dependency><groupId>com.google.protobuf</groupId>"
+            + "<artifactId>protobuf-java</artifactId><version>4.33.5</version></dependency>"
+            + "<dependency><groupId>io.grpc</groupId>"
+            + "<artifactId>grpc-protobuf</artifactId><version>1.78.0</version></dependency>"
+            + "<dependency><groupId>io.grpc</groupId>"
+            + "<artifactId>grpc-stub</artifactId><version>1.78.0</version></dependency>"
+            + "<dependency><groupId>com.company&amp;co</groupId>"
+            + "<artifactId>orders&lt;v2&gt;</artifactId><version>0.9.0</version></dependency>"
+            + "</dependencies>"
+            + "</project>";
+
+    @TempDir
+    Path tempDir;
+
+    private Path script;
+
+    @BeforeEach
+    void setUp() throws Exception {
+        assumeTrue(pythonAvailable(), "python3 not available on PATH");
+
+        try (InputStream in = getClass().getClassLoader().getResourceAsStream(TEMPLATE)) {
+            assertThat(in).as("template resource %s", TEMPLATE).isNotNull();
+            script = tempDir.resolve("pom_generator_generated.py");
+            Files.copy(in, script);
+        }
+    }
+
+    @Test
+    void pomWithDescriptionAndExtraDep_matchesExactBytes() throws Exception {
+        Path pom = tempDir.resolve("pom.xml");
+
+        ProcessResult result = runGenerator(List.of(
+                "--group-id", "com.company.proto",
+                "--artifact-id", "user-proto",
+                "--version", "1.2.3",
+                "--description", "User & account protos",
+                "--maven-dep", "com.company&co:orders<v2>:0.9.0",
+                "--out", pom.toString()));
+
+        assertThat(result.exitCode).as("generator output:\n%s", result.output).isZero();
+        assertThat(Files.readAllBytes(pom))
+                .isEqualTo(EXPECTED_POM.getBytes(StandardCharsets.UTF_8));
+    }
+
+    private ProcessResult runGenerator(List<String> args) throws Exception {
+        List<String> command = new ArrayList<>(List.of("python3", script.toString()));
+        command.addAll(args);
+        Process process = new ProcessBuilder(command)
+                .directory(tempDir.toFile())
+                .redirectErrorStream(true)
+                .start();
+        String output = new String(process.getInputStream().readAllBytes());
+        assertThat(process.waitFor(30, TimeUnit.SECONDS))
+                .as("generator timed out; output:\n%s", output).isTrue();
+        return new ProcessResult(process.exitValue(), output);
+    }
+
+    private static boolean pythonAvailable() {
+        try {
+            Process process = new ProcessBuilder("python3", "--version").start();
+            return process.waitFor(10, TimeUnit.SECONDS) && process.exitValue() == 0;
+        } catch (IOException | InterruptedException e) {
+            return false;
+        }
+    }
+
+    private record ProcessResult(int exitCode, String output) {
+    }
+}
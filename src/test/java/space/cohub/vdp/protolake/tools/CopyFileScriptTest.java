@@ -0,0 +1,162 @@
+package space.cohub.vdp.protolake.tools;
+
+import org.junit.jupiter.api.BeforeEach;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.IOException;
+import java.io.InputStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.List;
+import java.util.Random;
+import java.util.concurrent.TimeUnit;
+
+import static org.assertj.core.api.Assertions.assertThat;
+import static org.junit.jupiter.api.Assumptions.assumeTrue;
+
+/**
+ * Executes the {@code copy_file} helper each generated tool carries and pins
+ * that it never reports a short copy as success. The helper moves bytes with
+ * {@code os.copy_file_range}/{@code os.sendfile}; some FUSE and overlay mounts
+ * return 0 instead of failing, and procfs reports a size of 0 for files with
+ * content. Both must fall back to a read loop rather than leave a truncated
+ * (or empty) destination carrying the source's mode and mtime.
+ *
+ * <p>Skipped when {@code python3} is not on the PATH (the tools are stdlib-only,
+ * any python3 works).
+ */
+class CopyFileScriptTest {
+
+    private static final String TEMPLATE_DIR = "templates/tools/";
+
+    // Loads a tool by path, optionally forces the kernel copy calls to return
+    // 0, and copies argv[2] to argv[3] with the tool's copy_file
+    private static final String HARNESS = String.join("\n",
+            "import importlib.util, os, sys",
+            "spec = importlib.util.spec_from_file_location('tool', sys.argv[1])",
+            "tool = importlib.util.module_from_spec(spec)",
+            "spec.loader.exec_module(tool)",
+            "if sys.argv[4] == 'zero':",
+            "    os.copy_file_range = lambda *args: 0",
+            "    os.sendfile = lambda *args: 0",
+            "tool.copy_file(sys.argv[2], sys.argv[3])");
+
+    @TempDir
+    Path tempDir;
+
+    private Path source;
+
+    @BeforeEach
+    void setUp() throws Exception {
+        assumeTrue(pythonAvailable(), "python3 not available on PATH");
+
+        // Larger than the 1 MiB fallback buffer, so the read loop runs more than once
+        byte[] content = new byte[(3 << 20) + 17];
+        new Random(42).nextBytes(content);
+        source = Files.write(tempDir.resolve("source.bin"), content);
+    }
+
+    @Test
+    void npmBundler_kernelCopyReturningZero_fallsBackToFullCopy() throws Exception {
+        assertCopiesWholeFileWhenKernelCopyReturnsZero("bundler/npm_bundler_generated.py");
+    }
+
+    @Test
+    void npmBundler_zeroStatSizeSource_isCopiedByReading() throws Exception {
+        assertCopiesProcfsFile("bundler/npm_bundler_generated.py");
+    }
+
+    @Test
+    void wheelBuilder_kernelCopyReturningZero_fallsBackToFullCopy() throws Exception {
+        assertCopiesWholeFileWhenKernelCopyReturnsZero("bundler/wheel_builder_generated.py");
+    }
+
+    @Test
+    void wheelBuilder_zeroStatSizeSource_isCopiedByReading() throws Exception {
+        assertCopiesProcfsFile("bundler/wheel_builder_generated.py");
+    }
+
+    @Test
+    void pkgEditor_kernelCopyReturningZero_fallsBackToFullCopy() throws Exception {
+        assertCopiesWholeFileWhenKernelCopyReturnsZero("pkg_editor_generated.py");
+    }
+
+    @Test
+    void pkgEditor_zeroStatSizeSource_isCopiedByReading() throws Exception {
+        assertCopiesProcfsFile("pkg_editor_generated.py");
+    }
+
+    @Test
+    void publisherUtils_kernelCopyReturningZero_fallsBackToFullCopy() throws Exception {
+        assertCopiesWholeFileWhenKernelCopyReturnsZero("publish/publisher_utils_generated.py");
+    }
+
+    @Test
+    void publisherUtils_zeroStatSizeSource_isCopiedByReading() throws Exception {
+        assertCopiesProcfsFile("publish/publisher_utils_generated.py");
+    }
+
+    private void assertCopiesWholeFileWhenKernelCopyReturnsZero(String template)
+            throws Exception {
+        Path tool = copyTemplate(template);
+        Path dest = tempDir.resolve("dest.bin");
+
+        ProcessResult result = runCopy(tool, source, dest, "zero");
+
+        assertThat(result.exitCode).as("copy output:\n%s", result.output).isZero();
+        assertThat(dest).hasSameBinaryContentAs(source);
+        assertThat(Files.getLastModifiedTime(dest))
+                .isEqualTo(Files.getLastModifiedTime(source));
+    }
+
+    private void assertCopiesProcfsFile(String template) throws Exception {
+        Path status = Path.of("/proc/self/status");
+        assumeTrue(Files.isReadable(status), "procfs not available");
+        Path tool = copyTemplate(template);
+        Path dest = tempDir.resolve("status");
+
+        ProcessResult result = runCopy(tool, status, dest, "kernel");
+
+        assertThat(result.exitCode).as("copy output:\n%s", result.output).isZero();
+        // The copy reads the copying process's own status, so only pin that
+        // it is not the empty file the 0 stat size would suggest
+        assertThat(Files.readString(dest)).contains("Name:");
+    }
+
+    private Path copyTemplate(String name) throws IOException {
+        try (InputStream in = getClass().getClassLoader()
+                .getResourceAsStream(TEMPLATE_DIR + name)) {
+            assertThat(in).as("template resource %s", name).isNotNull();
+            Path target = tempDir.resolve(Path.of(name).getFileName());
+            Files.copy(in, target);
+            return target;
+        }
+    }
+
+    private ProcessResult runCopy(Path tool, Path src, Path dst, String mode)
+            throws Exception {
+        List<String> command = List.of(
+                "python3", "-c", HARNESS, tool.toString(), src.toString(), dst.toString(), mode);
+        Process process = new ProcessBuilder(command)
+                .directory(tempDir.toFile())
+                .redirectErrorStream(true)
+                .start();
+        String output = new String(process.getInputStream().readAllBytes());
+        assertThat(process.waitFor(30, TimeUnit.SECONDS))
+                .as("copy timed out; output:\n%s", output).isTrue();
+        return new ProcessResult(process.exitValue(), output);
+    }
+
+    private static boolean pythonAvailable() {
+        try {
+            Process process = new ProcessBuilder("python3", "--version").start();
+            return process.waitFor(10, TimeUnit.SECONDS) && process.exitValue() == 0;
+        } catch (IOException | InterruptedException e) {
+            return false;
+        }
+    }
+
+    private record ProcessResult(int exitCode, String output) {
+    }
+}
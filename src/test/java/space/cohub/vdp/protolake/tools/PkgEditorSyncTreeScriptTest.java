@@ -0,0 +1,188 @@
+package space.cohub.vdp.protolake.tools;
+
+import org.junit.jupiter.api.BeforeEach;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.IOException;
+import java.io.InputStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.attribute.FileTime;
+import java.nio.file.attribute.PosixFilePermissions;
+import java.util.List;
+import java.util.Map;
+import java.util.TreeMap;
+import java.util.concurrent.TimeUnit;
+import java.util.stream.Stream;
+
+import static org.assertj.core.api.Assertions.assertThat;
+import static org.junit.jupiter.api.Assumptions.assumeTrue;
+
+/**
+ * Executes pkg_editor's {@code sync_tree}, which workspace installs use to
+ * refresh {@code <target>/protolake/<pkg>/} in place. It deletes entries that
+ * left the package, swaps files and directories that changed kind, and skips
+ * files whose size and mtime already match — so a re-install must still end
+ * with the destination an exact copy of the source.
+ *
+ * <p>Skipped when {@code python3} is not on the PATH (the script is stdlib-only,
+ * any python3 works).
+ */
+class PkgEditorSyncTreeScriptTest {
+
+    private static final String TEMPLATE = "templates/tools/pkg_editor_generated.py";
+
+    private static final String HARNESS = String.join("\n",
+            "import importlib.util, sys",
+            "spec = importlib.util.spec_from_file_location('pkg_editor', sys.argv[1])",
+            "pkg_editor = importlib.util.module_from_spec(spec)",
+            "spec.loader.exec_module(pkg_editor)",
+            "pkg_editor.sync_tree(sys.argv[2], sys.argv[3])");
+
+    private static final FileTime FIRST_BUILD = FileTime.fromMillis(1_700_000_000_000L);
+    private static final FileTime SECOND_BUILD = FileTime.fromMillis(1_700_000_600_000L);
+
+    @TempDir
+    Path tempDir;
+
+    private Path script;
+    private Path src;
+    private Path dst;
+
+    @BeforeEach
+    void setUp() throws Exception {
+        assumeTrue(pythonAvailable(), "python3 not available on PATH");
+
+        try (InputStream in = getClass().getClassLoader().getResourceAsStream(TEMPLATE)) {
+            assertThat(in).as("template resource %s", TEMPLATE).isNotNull();
+            script = tempDir.resolve("pkg_editor_generated.py");
+            Files.copy(in, script);
+        }
+        src = Files.createDirectories(tempDir.resolve("package"));
+        dst = tempDir.resolve("target/protolake/company-user-proto");
+    }
+
+    @Test
+    void firstInstall_copiesWholeTree() throws Exception {
+        writeFirstBuild();
+
+        ProcessResult result = runSyncTree();
+
+        assertThat(result.exitCode).as("sync output:\n%s", result.output).isZero();
+        assertThat(snapshot(dst)).isEqualTo(snapshot(src));
+        assertThat(Files.getLastModifiedTime(dst.resolve("index.js"))).isEqualTo(FIRST_BUILD);
+    }
+
+    @Test
+    void reinstall_updatesChangedFiles_removesStaleOnes_andSwapsFileDirConflicts()
+            throws Exception {
+        writeFirstBuild();
+        assertThat(runSyncTree().exitCode).isZero();
+
+        // Same size, new mtime: only the mtime tells the file apart
+        write("index.js", "export * from './v2';\n", SECOND_BUILD);
+        Files.delete(src.resolve("lib/b.js"));
+        // file -> directory and directory -> file
+        Files.delete(src.resolve("types"));
+        write("types/index.d.ts", "export {};\n", SECOND_BUILD);
+        deleteTree(src.resolve("proto"));
+        write("proto", "moved\n", SECOND_BUILD);
+
+        ProcessResult result = runSyncTree();
+
+        assertThat(result.exitCode).as("sync output:\n%s", result.output).isZero();
+        assertThat(snapshot(dst)).isEqualTo(snapshot(src));
+        assertThat(dst.resolve("lib/b.js")).doesNotExist();
+        assertThat(dst.resolve("types")).isDirectory();
+        assertThat(dst.resolve("proto")).isRegularFile();
+        assertThat(Files.getLastModifiedTime(dst.resolve("index.js"))).isEqualTo(SECOND_BUILD);
+    }
+
+    @Test
+    void reinstall_replacesReadOnlyFilesFromEarlierInstall() throws Exception {
+        // Bazel outputs are 0444, and the install copies the mode along
+        writeReadOnly("index.js", "export * from './v1';\n", FIRST_BUILD);
+        writeReadOnly("lib/a.js", "export const a = 1;\n", FIRST_BUILD);
+        assertThat(runSyncTree().exitCode).isZero();
+
+        writeReadOnly("index.js", "export * from './v2';\n", SECOND_BUILD);
+
+        ProcessResult result = runSyncTree();
+
+        assertThat(result.exitCode).as("sync output:\n%s", result.output).isZero();
+        assertThat(snapshot(dst)).isEqualTo(snapshot(src));
+        assertThat(Files.getPosixFilePermissions(dst.resolve("index.js")))
+                .isEqualTo(PosixFilePermissions.fromString("r--r--r--"));
+    }
+
+    private void writeFirstBuild() throws IOException {
+        write("package.json", "{\"name\": \"@company/user-proto\"}\n", FIRST_BUILD);
+        write("index.js", "export * from './v1';\n", FIRST_BUILD);
+        write("lib/a.js", "export const a = 1;\n", FIRST_BUILD);
+        write("lib/b.js", "export const b = 2;\n", FIRST_BUILD);
+        write("types", "not yet a directory\n", FIRST_BUILD);
+        write("proto/user/v1/user.proto", "syntax = \"proto3\";\n", FIRST_BUILD);
+    }
+
+    private void write(String relative, String content, FileTime mtime) throws IOException {
+        Path file = src.resolve(relative);
+        Files.createDirectories(file.getParent());
+        Files.writeString(file, content);
+        Files.setLastModifiedTime(file, mtime);
+    }
+
+    private void writeReadOnly(String relative, String content, FileTime mtime)
+            throws IOException {
+        // Replaced rather than rewritten, as bazel does with its outputs
+        Files.deleteIfExists(src.resolve(relative));
+        write(relative, content, mtime);
+        Files.setPosixFilePermissions(src.resolve(relative),
+                PosixFilePermissions.fromString("r--r--r--"));
+    }
+
+    /** Relative path -> "dir" or file content, for both trees. */
+    private static Map<String, String> snapshot(Path root) throws IOException {
+        Map<String, String> entries = new TreeMap<>();
+        try (Stream<Path> paths = Files.walk(root)) {
+            for (Path path : (Iterable<Path>) paths::iterator) {
+                String key = root.relativize(path).toString();
+                entries.put(key, Files.isDirectory(path) ? "dir" : Files.readString(path));
+            }
+        }
+        return entries;
+    }
+
+    private static void deleteTree(Path root) throws IOException {
+        try (Stream<Path> paths = Files.walk(root)) {
+            for (Path path : paths.sorted((a, b) -> b.compareTo(a)).toList()) {
+                Files.delete(path);
+            }
+        }
+    }
+
+    private ProcessResult runSyncTree() throws Exception {
+        List<String> command = List.of(
+                "python3", "-c", HARNESS, script.toString(), src.toString(), dst.toString());
+        Process process = new ProcessBuilder(command)
+                .directory(tempDir.toFile())
+                .redirectErrorStream(true)
+                .start();
+        String output = new String(process.getInputStream().readAllBytes());
+        assertThat(process.waitFor(30, TimeUnit.SECONDS))
+                .as("sync timed out; output:\n%s", output).isTrue();
+        return new ProcessResult(process.exitValue(), output);
+    }
+
+    private static boolean pythonAvailable() {
+        try {
+            Process process = new ProcessBuilder("python3", "--version").start();
+            return process.waitFor(10, TimeUnit.SECONDS) && process.exitValue() == 0;
+        } catch (IOException | InterruptedException e) {
+            return false;
+        }
+    }
+
+    private record ProcessResult(int exitCode, String output) {
+    }
+}